@@ -7,14 +7,16 @@ import pytz
 import os
 
 from .db import db
+from .cache import cache
 from flask_migrate import Migrate # type: ignore
 from .models import (
     LearningCourse, LearningSection, 
     UserCourseProgress, UserSectionProgress,
     Transaction,
     CommunityPost, CommunityComment, CommunityLike,
-    Achievement, UserAchievement,
-    MentorAvailability, MentorBooking, Event, EventRegistration
+    Achievement, UserAchievement, UserAchievementStats, LeaderboardEntry,
+    AvailabilityTemplate, MentorAvailability, MentorBooking, Event, EventRegistration,
+    OutboxEvent
     
     
 )
@@ -65,6 +67,7 @@ def create_app(config_class=None):
     db.init_app(app)
     jwt.init_app(app)
     migrate.init_app(app, db)
+    cache.init_app(app)
     
     # Configurar y iniciar APScheduler
     scheduler.init_app(app)
@@ -76,10 +79,20 @@ def create_app(config_class=None):
     from app.routes.community import community_bp
     from app.routes.achievements import achievements_bp
     from app.routes.calendar import calendar_bp
+    from app.routes.search import search_bp
     app.register_blueprint(learning_bp)
     app.register_blueprint(finance_bp)
     app.register_blueprint(community_bp)
     app.register_blueprint(achievements_bp)
     app.register_blueprint(calendar_bp)
+    app.register_blueprint(search_bp)
+    
+    # Comandos de CLI (flask check-indexes)
+    from app.query_plans import register_commands
+    register_commands(app)
+    
+    # Jobs en segundo plano (flask process-outbox)
+    from app.jobs import register_jobs
+    register_jobs(app, scheduler)
 
     return app
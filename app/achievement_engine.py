@@ -0,0 +1,344 @@
+"""
+Motor de logros basado en eventos.
+
+Las reglas (filas de Achievement) se cargan una vez en un índice en memoria por
+(requirement_type, requirement_value). Cada evento de dominio, ej:
+('course_completed', course_id) o ('first_sale', None), se evalúa solo contra
+las reglas que le aplican:
+
+1. una consulta para saber cuáles de esas reglas ya desbloqueó el usuario,
+2. una consulta de condición por (tipo, valor) distinto, no por logro,
+3. un único INSERT ... ON CONFLICT con todos los desbloqueos,
+4. la actualización de user_achievement_stats y de los tableros de posiciones
+   con los desbloqueos nuevos.
+
+El motor no hace commit; lo hace quien lo llama.
+
+Las rutas no evalúan logros en la petición: registran el evento de dominio en
+la tabla outbox_events (record_event, en la misma transacción que el cambio) y
+el job `process_outbox` del scheduler los procesa en segundo plano.
+"""
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytz
+from sqlalchemy import exists, and_, func
+
+from app.db import db, upsert_insert
+from app.leaderboard import record_user_points
+from app.models import (
+    Achievement, UserAchievement, UserAchievementStats,
+    UserCourseProgress, Transaction, CommunityPost, OutboxEvent
+)
+
+bolivia_tz = pytz.timezone('America/La_Paz')
+
+# Segundos antes de recargar las reglas (otros workers pueden haberlas cambiado)
+RULES_TTL = 300
+
+# Eventos del outbox procesados por ejecución del job
+OUTBOX_BATCH_SIZE = 200
+
+# Intentos antes de descartar un evento que falla
+OUTBOX_MAX_ATTEMPTS = 5
+
+# Días que se conservan los eventos ya procesados
+OUTBOX_RETENTION_DAYS = 7
+
+
+def course_completed(user_id, course_id):
+    """El usuario completó el curso course_id"""
+    return db.session.query(exists().where(and_(
+        UserCourseProgress.user_id == user_id,
+        UserCourseProgress.course_id == course_id,
+        UserCourseProgress.progress_percentage >= 100
+    ))).scalar()
+
+
+def first_course_completed(user_id, value=None):
+    """El usuario completó al menos un curso"""
+    return db.session.query(exists().where(and_(
+        UserCourseProgress.user_id == user_id,
+        UserCourseProgress.progress_percentage >= 100
+    ))).scalar()
+
+
+def first_sale(user_id, value=None):
+    """El usuario registró al menos un ingreso"""
+    return db.session.query(exists().where(and_(
+        Transaction.user_id == user_id,
+        Transaction.type == 'ingreso'
+    ))).scalar()
+
+
+def first_post(user_id, value=None):
+    """El usuario publicó al menos un post"""
+    return db.session.query(exists().where(
+        CommunityPost.user_id == user_id
+    )).scalar()
+
+
+# requirement_type -> condición(user_id, requirement_value)
+CONDITIONS = {
+    'course_completed': course_completed,
+    'first_course_completed': first_course_completed,
+    'first_sale': first_sale,
+    'first_post': first_post,
+}
+
+
+class RuleIndex:
+    """Índice en memoria de las reglas de logros por (tipo, valor)"""
+
+    def __init__(self, ttl=RULES_TTL):
+        self.ttl = ttl
+        self._by_key = {}
+        self._by_type = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self, *args):
+        """Forzar la recarga en el próximo uso"""
+        self._loaded_at = None
+
+    def _load(self):
+        by_key = {}
+        by_type = {}
+        for achievement in Achievement.query.all():
+            rule = achievement.to_dict()
+            by_key.setdefault((rule['requirement_type'], rule['requirement_value']), []).append(rule)
+            by_type.setdefault(rule['requirement_type'], []).append(rule)
+        self._by_key = by_key
+        self._by_type = by_type
+        self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._load()
+
+    def rules_for(self, event_type, value=None):
+        """Reglas que aplican a un evento; sin valor aplican todas las del tipo"""
+        self._ensure_loaded()
+        if value is None:
+            return list(self._by_type.get(event_type, []))
+        return list(self._by_key.get((event_type, value), []))
+
+
+rule_index = RuleIndex()
+
+
+def evaluate_events(user_id, events):
+    """
+    Evaluar eventos (lista de (tipo, valor)) y desbloquear los logros cumplidos.
+    Retorna la lista de logros desbloqueados (dicts). No hace commit.
+    """
+    rules = {}
+    for event_type, value in events:
+        for rule in rule_index.rules_for(event_type, value):
+            rules[rule['id']] = rule
+
+    if not rules:
+        return []
+
+    # Logros ya desbloqueados por el usuario entre los candidatos
+    already_unlocked = {
+        achievement_id for (achievement_id,) in db.session.query(UserAchievement.achievement_id).filter(
+            UserAchievement.user_id == user_id,
+            UserAchievement.achievement_id.in_(list(rules)),
+            UserAchievement.progress >= 100
+        ).all()
+    }
+
+    # Una consulta de condición por (tipo, valor) distinto
+    results = {}
+    unlocked = []
+    for rule in rules.values():
+        if rule['id'] in already_unlocked:
+            continue
+        condition = CONDITIONS.get(rule['requirement_type'])
+        if condition is None:
+            continue
+        key = (rule['requirement_type'], rule['requirement_value'])
+        if key not in results:
+            results[key] = condition(user_id, rule['requirement_value'])
+        if results[key]:
+            unlocked.append(rule)
+
+    if unlocked:
+        now = datetime.now(bolivia_tz)
+        stmt = upsert_insert(UserAchievement).values([
+            {
+                'id': str(uuid.uuid4()),
+                'user_id': user_id,
+                'achievement_id': rule['id'],
+                'progress': 100,
+                'unlocked_at': now
+            }
+            for rule in unlocked
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'achievement_id'],
+            set_={'progress': 100, 'unlocked_at': now},
+            where=UserAchievement.progress < 100
+        ).returning(UserAchievement.achievement_id)
+
+        # RETURNING solo incluye las filas que realmente se insertaron o
+        # actualizaron (otra transacción pudo desbloquear alguna antes)
+        written = {achievement_id for (achievement_id,) in db.session.execute(stmt).all()}
+        unlocked = [rule for rule in unlocked if rule['id'] in written]
+        update_user_stats(user_id, unlocked)
+
+    return unlocked
+
+
+def compute_user_stats(user_id):
+    """Calcular (puntos, desbloqueados, por categoría) desde user_achievements"""
+    rows = db.session.query(
+        Achievement.category,
+        func.count(UserAchievement.id),
+        func.coalesce(func.sum(Achievement.points), 0)
+    ).join(
+        Achievement, Achievement.id == UserAchievement.achievement_id
+    ).filter(
+        UserAchievement.user_id == user_id,
+        UserAchievement.progress >= 100
+    ).group_by(Achievement.category).all()
+
+    total_points = 0
+    unlocked_count = 0
+    by_category = {}
+    for category, count, points in rows:
+        category = category or 'otros'
+        by_category[category] = by_category.get(category, 0) + count
+        unlocked_count += count
+        total_points += int(points)
+    return total_points, unlocked_count, by_category
+
+
+def update_user_stats(user_id, unlocked_rules):
+    """
+    Sumar los logros recién desbloqueados a las estadísticas del usuario.
+    La fila se bloquea (FOR UPDATE) para que las actualizaciones concurrentes no
+    se pisen. Si la fila no existía se calcula completa desde user_achievements.
+    No hace commit.
+    """
+    created = db.session.execute(
+        upsert_insert(UserAchievementStats).values(
+            user_id=user_id, total_points=0, unlocked_count=0, by_category={}
+        ).on_conflict_do_nothing().returning(UserAchievementStats.user_id)
+    ).first() is not None
+
+    stats = db.session.get(UserAchievementStats, user_id, with_for_update=True, populate_existing=True)
+
+    if created:
+        stats.total_points, stats.unlocked_count, stats.by_category = compute_user_stats(user_id)
+    else:
+        by_category = dict(stats.by_category or {})
+        for rule in unlocked_rules:
+            category = rule['category'] or 'otros'
+            by_category[category] = by_category.get(category, 0) + 1
+        stats.total_points = (stats.total_points or 0) + sum(rule['points'] or 0 for rule in unlocked_rules)
+        stats.unlocked_count = (stats.unlocked_count or 0) + len(unlocked_rules)
+        stats.by_category = by_category
+
+    if unlocked_rules or (created and stats.unlocked_count):
+        record_user_points(user_id, stats.total_points)
+    return stats
+
+
+def get_user_stats(user_id):
+    """
+    Leer las estadísticas materializadas del usuario (lectura por clave primaria).
+    Si aún no existen se calculan y guardan una vez. No hace commit.
+    """
+    stats = db.session.get(UserAchievementStats, user_id)
+    if stats is None:
+        stats = update_user_stats(user_id, [])
+    return stats
+
+
+def evaluate_event(user_id, event_type, value=None):
+    """Evaluar un solo evento de dominio. No hace commit."""
+    return evaluate_events(user_id, [(event_type, value)])
+
+
+def achievement_events_for(event_type, value=None):
+    """Traducir un evento de dominio a los eventos de logros que dispara"""
+    if event_type == 'course_completed':
+        return [('course_completed', value), ('first_course_completed', None)]
+    if event_type == 'transaction_created':
+        return [('first_sale', None)] if value == 'ingreso' else []
+    if event_type == 'post_created':
+        return [('first_post', None)]
+    return []
+
+
+def record_event(user_id, event_type, value=None):
+    """
+    Registrar un evento de dominio en el outbox. Se agrega a la sesión actual,
+    por lo que se guarda en el mismo commit que el cambio que lo origina.
+    """
+    event = OutboxEvent(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        event_type=event_type,
+        event_value=value
+    )
+    db.session.add(event)
+    return event
+
+
+def process_outbox(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Procesar eventos pendientes del outbox agrupados por usuario.
+    Retorna el número de eventos leídos.
+    """
+    query = OutboxEvent.query.filter(
+        OutboxEvent.processed_at.is_(None)
+    ).order_by(OutboxEvent.created_at).limit(batch_size)
+    
+    # Cada worker de gunicorn corre su propio scheduler: SKIP LOCKED evita
+    # que dos workers procesen el mismo evento
+    if db.engine.dialect.name == 'postgresql':
+        query = query.with_for_update(skip_locked=True)
+    
+    pending = query.all()
+    if not pending:
+        db.session.commit()
+        return 0
+    
+    by_user = {}
+    for event in pending:
+        by_user.setdefault(event.user_id, []).append(event)
+    
+    now = datetime.now(bolivia_tz)
+    for user_id, events in by_user.items():
+        achievement_events = [
+            achievement_event
+            for event in events
+            for achievement_event in achievement_events_for(event.event_type, event.event_value)
+        ]
+        try:
+            with db.session.begin_nested():
+                evaluate_events(user_id, achievement_events)
+            for event in events:
+                event.processed_at = now
+        except Exception as e:
+            for event in events:
+                event.attempts = (event.attempts or 0) + 1
+                event.last_error = str(e)
+                if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    event.processed_at = now
+    
+    # Limpiar eventos procesados antiguos
+    OutboxEvent.query.filter(
+        OutboxEvent.processed_at < now - timedelta(days=OUTBOX_RETENTION_DAYS)
+    ).delete(synchronize_session=False)
+    
+    db.session.commit()
+    return len(pending)
@@ -0,0 +1,442 @@
+"""
+Consultas por rango de tiempo sobre la disponibilidad de mentores.
+
+Cada MentorAvailability guarda, además de date/start_time/end_time, el
+intervalo [starts_at, ends_at) en hora de Bolivia; se calcula solo al
+insertar o actualizar (sync_slot_bounds).
+
+- PostgreSQL: la restricción de exclusión
+  mentor_availability_no_overlap (GiST sobre mentor_id y
+  tstzrange(starts_at, ends_at)) rechaza franjas disponibles que se solapan
+  para el mismo mentor, y su índice resuelve las consultas con `&&`.
+- Otros motores (SQLite local): índice btree (mentor_id, starts_at) y la
+  misma comprobación de solapamiento hecha antes de escribir.
+
+La disponibilidad recurrente se guarda una sola vez como AvailabilityTemplate
+(regla semanal: BYDAY, INTERVAL, UNTIL) y se expande al leer, solo para la
+ventana pedida (expand_templates). Cada instancia tiene un id virtual
+'tpl:<template_id>:<fecha>'; al reservarla se materializa como fila de
+mentor_availability (materialize_slot), única por (template_id, date).
+Las plantillas de un mentor no pueden solaparse entre sí
+(check_template_overlap), y la expansión omite las instancias que chocan con
+una franja disponible o con una plantilla creada antes.
+"""
+import math
+from datetime import datetime, timedelta
+
+import pytz
+from sqlalchemy import DDL, and_, case, event, func, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from app.db import db
+from app.models import AvailabilityTemplate, MentorAvailability
+
+bolivia_tz = pytz.timezone('America/La_Paz')
+
+# Duración máxima de una franja; acota el rango del índice btree en SQLite
+MAX_SLOT_LENGTH = timedelta(days=1)
+
+# Cupos de una franja: max_participants en grupales, 1 en individuales
+SEAT_CAPACITY = case(
+    (MentorAvailability.session_type == 'grupo', func.coalesce(MentorAvailability.max_participants, 1)),
+    else_=1
+)
+
+
+class SlotOverlapError(ValueError):
+    """La franja se solapa con otra franja disponible del mismo mentor"""
+
+
+OVERLAP_MESSAGE = 'La franja se solapa con otra disponibilidad del mentor'
+
+
+# Días de la semana en formato RRULE (BYDAY), en el orden de date.weekday()
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+# Prefijo de los ids de instancias de plantillas no materializadas
+VIRTUAL_PREFIX = 'tpl:'
+
+# Ventana de expansión por defecto y máxima de las plantillas
+TEMPLATE_HORIZON = timedelta(weeks=4)
+MAX_INTERVAL_WEEKS = 52
+MAX_TEMPLATE_WINDOW = timedelta(days=366)
+
+
+def slot_bounds(slot_date, start_time, end_time):
+    """Intervalo [inicio, fin) en hora de Bolivia; si termina antes de empezar, cruza la medianoche"""
+    starts_at = bolivia_tz.localize(datetime.combine(slot_date, start_time))
+    ends_at = bolivia_tz.localize(datetime.combine(slot_date, end_time))
+    if ends_at <= starts_at:
+        ends_at += timedelta(days=1)
+    return starts_at, ends_at
+
+
+def local_datetime(value):
+    """Interpretar un datetime sin zona horaria como hora de Bolivia"""
+    return bolivia_tz.localize(value) if value.tzinfo is None else value
+
+
+def overlaps(start, end):
+    """Condición: la franja se solapa con [start, end)"""
+    if db.engine.dialect.name == 'postgresql':
+        return func.tstzrange(MentorAvailability.starts_at, MentorAvailability.ends_at, '[)').op('&&')(
+            func.tstzrange(start, end, '[)')
+        )
+    return and_(
+        MentorAvailability.starts_at < end,
+        MentorAvailability.starts_at > start - MAX_SLOT_LENGTH,
+        MentorAvailability.ends_at > start
+    )
+
+
+def availability_query(start=None, end=None, mentor_id=None, session_type=None, free_only=False):
+    """Franjas disponibles que se solapan con [start, end), ordenadas por inicio"""
+    query = MentorAvailability.query.filter(MentorAvailability.is_available.is_(True))
+
+    if mentor_id:
+        query = query.filter(MentorAvailability.mentor_id == mentor_id)
+
+    if start is not None and end is not None:
+        query = query.filter(overlaps(start, end))
+    elif start is not None:
+        query = query.filter(MentorAvailability.ends_at > start)
+    elif end is not None:
+        query = query.filter(MentorAvailability.starts_at < end)
+
+    if session_type:
+        query = query.filter(MentorAvailability.session_type == session_type)
+
+    if free_only:
+        query = query.filter(MentorAvailability.seats_taken < SEAT_CAPACITY)
+
+    return query.order_by(MentorAvailability.starts_at, MentorAvailability.id)
+
+
+def parse_weekdays(value):
+    """Normalizar BYDAY ('MO,WE' o ['MO', 'WE']) a 'MO,WE'; lanza ValueError si no es válido"""
+    if isinstance(value, str):
+        value = value.split(',')
+    days = {str(day).strip().upper() for day in value or []}
+    if not days or not days <= set(WEEKDAYS):
+        raise ValueError(f'weekdays debe contener días entre {", ".join(WEEKDAYS)}')
+    return ','.join(day for day in WEEKDAYS if day in days)
+
+
+def occurs_on(template, slot_date):
+    """La regla semanal de la plantilla incluye slot_date"""
+    if slot_date < template.starts_on or (template.until and slot_date > template.until):
+        return False
+    if WEEKDAYS[slot_date.weekday()] not in template.weekdays.split(','):
+        return False
+    # INTERVAL cuenta semanas (de lunes a domingo) desde la semana de inicio
+    first_week = template.starts_on - timedelta(days=template.starts_on.weekday())
+    weeks = (slot_date - first_week).days // 7
+    return weeks % (template.interval_weeks or 1) == 0
+
+
+def virtual_slot_id(template_id, slot_date):
+    return f'{VIRTUAL_PREFIX}{template_id}:{slot_date.isoformat()}'
+
+
+def parse_virtual_slot_id(slot_id):
+    """(template_id, fecha) de un id virtual, o None si no lo es"""
+    if not slot_id or not slot_id.startswith(VIRTUAL_PREFIX):
+        return None
+    template_id, _, slot_date = slot_id[len(VIRTUAL_PREFIX):].rpartition(':')
+    try:
+        return template_id, datetime.strptime(slot_date, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+class VirtualSlot:
+    """Instancia de una plantilla aún no materializada; misma forma que MentorAvailability"""
+
+    def __init__(self, template, slot_date):
+        self.template = template
+        self.id = virtual_slot_id(template.id, slot_date)
+        self.date = slot_date
+        self.starts_at, self.ends_at = slot_bounds(slot_date, template.start_time, template.end_time)
+
+    def to_dict(self):
+        template = self.template
+        return {
+            'id': self.id,
+            'mentor_id': template.mentor_id,
+            'template_id': template.id,
+            'date': self.date.isoformat(),
+            'start_time': template.start_time.strftime('%H:%M'),
+            'end_time': template.end_time.strftime('%H:%M'),
+            'starts_at': self.starts_at.isoformat(),
+            'ends_at': self.ends_at.isoformat(),
+            'session_type': template.session_type,
+            'max_participants': template.max_participants,
+            'is_available': True,
+            'booked_count': 0,
+            'created_at': template.created_at.isoformat() if template.created_at else None,
+            'updated_at': template.updated_at.isoformat() if template.updated_at else None
+        }
+
+
+def template_window(start=None, end=None):
+    """Ventana de expansión: por defecto TEMPLATE_HORIZON desde hoy, acotada a MAX_TEMPLATE_WINDOW"""
+    if start is None:
+        today = datetime.now(bolivia_tz).date()
+        start = local_datetime(datetime.combine(today, datetime.min.time()))
+    if end is None:
+        end = start + TEMPLATE_HORIZON
+    return start, min(end, start + MAX_TEMPLATE_WINDOW)
+
+
+def expand_templates(start, end, mentor_id=None, session_type=None):
+    """
+    Instancias (VirtualSlot) de las plantillas activas que se solapan con
+    [start, end), sin las ya materializadas ni las que chocan con una franja
+    disponible del mismo mentor o con una instancia de una plantilla creada
+    antes. Usa una consulta para las plantillas y otra para las franjas
+    existentes de la ventana.
+    """
+    first_date = (start - MAX_SLOT_LENGTH).date()
+    last_date = end.date()
+
+    # Sin filtrar por session_type: las plantillas de otro tipo también ocupan al mentor
+    query = AvailabilityTemplate.query.filter(
+        AvailabilityTemplate.is_active.is_(True),
+        AvailabilityTemplate.starts_on <= last_date,
+        or_(AvailabilityTemplate.until.is_(None), AvailabilityTemplate.until >= first_date)
+    )
+    if mentor_id:
+        query = query.filter(AvailabilityTemplate.mentor_id == mentor_id)
+    templates = sorted(query.all(), key=lambda template: (local_datetime(template.created_at), template.id))
+    if not templates:
+        return []
+
+    # Franjas existentes de los mentores en la ventana (incluye instancias materializadas)
+    existing = db.session.query(
+        MentorAvailability.mentor_id,
+        MentorAvailability.template_id,
+        MentorAvailability.date,
+        MentorAvailability.starts_at,
+        MentorAvailability.ends_at,
+        MentorAvailability.is_available
+    ).filter(
+        MentorAvailability.mentor_id.in_({template.mentor_id for template in templates}),
+        MentorAvailability.starts_at < end + MAX_SLOT_LENGTH,
+        MentorAvailability.starts_at > start - 2 * MAX_SLOT_LENGTH
+    ).all()
+    materialized = {(row.template_id, row.date) for row in existing if row.template_id}
+    busy = {}
+    for row in existing:
+        if row.is_available:
+            busy.setdefault(row.mentor_id, []).append(
+                (local_datetime(row.starts_at), local_datetime(row.ends_at))
+            )
+
+    slots = []
+    for template in templates:
+        mentor_busy = busy.setdefault(template.mentor_id, [])
+        for slot_date in template_dates(template, first_date, last_date):
+            if (template.id, slot_date) in materialized:
+                continue
+            slot = VirtualSlot(template, slot_date)
+            if any(busy_start < slot.ends_at and busy_end > slot.starts_at for busy_start, busy_end in mentor_busy):
+                continue
+            # La instancia ocupa al mentor para las plantillas siguientes
+            mentor_busy.append((slot.starts_at, slot.ends_at))
+            if slot.starts_at < end and slot.ends_at > start and (
+                not session_type or template.session_type == session_type
+            ):
+                slots.append(slot)
+    return slots
+
+
+def template_dates(template, first_date, last_date):
+    """Fechas entre first_date y last_date (inclusive) que incluye la regla de la plantilla"""
+    slot_date = first_date
+    while slot_date <= last_date:
+        if occurs_on(template, slot_date):
+            yield slot_date
+        slot_date += timedelta(days=1)
+
+
+def templates_overlap(template, other):
+    """
+    Alguna instancia de una plantilla se solapa con una de la otra. Las dos
+    reglas se repiten cada mcm(INTERVAL) semanas, así que basta comparar ese
+    período desde que ambas están vigentes.
+    """
+    first_date = max(template.starts_on, other.starts_on) - timedelta(days=1)
+    period = math.lcm(template.interval_weeks or 1, other.interval_weeks or 1)
+    last_date = first_date + timedelta(weeks=period, days=2)
+    for until in (template.until, other.until):
+        if until:
+            last_date = min(last_date, until + timedelta(days=1))
+
+    instances = sorted(
+        (*slot_bounds(slot_date, item.start_time, item.end_time), index)
+        for index, item in enumerate((template, other))
+        for slot_date in template_dates(item, first_date, last_date)
+    )
+    # Recorrido por inicio: basta comparar con el mayor fin visto de la otra plantilla
+    latest_end = [None, None]
+    for starts_at, ends_at, index in instances:
+        other_end = latest_end[1 - index]
+        if other_end is not None and other_end > starts_at:
+            return True
+        if latest_end[index] is None or ends_at > latest_end[index]:
+            latest_end[index] = ends_at
+    return False
+
+
+def slot_sort_key(slot):
+    """Orden común de franjas concretas y virtuales"""
+    return local_datetime(slot.starts_at), slot.id
+
+
+def rule_slot(slot_id):
+    """
+    Franja de un id virtual según la regla: la fila materializada si existe,
+    la instancia virtual si la plantilla la incluye, o None.
+    """
+    parsed = parse_virtual_slot_id(slot_id)
+    if parsed is None:
+        return None
+    template_id, slot_date = parsed
+
+    availability = MentorAvailability.query.filter_by(template_id=template_id, date=slot_date).first()
+    if availability is not None:
+        return availability
+
+    template = db.session.get(AvailabilityTemplate, template_id)
+    if template is None or not template.is_active or not occurs_on(template, slot_date):
+        return None
+    return VirtualSlot(template, slot_date)
+
+
+def is_expanded(slot):
+    """La instancia virtual no choca con otras franjas (aparece en expand_templates)"""
+    return any(
+        item.id == slot.id
+        for item in expand_templates(slot.starts_at, slot.ends_at, mentor_id=slot.template.mentor_id)
+    )
+
+
+def find_virtual_slot(slot_id):
+    """Franja de un id virtual, o None si no existe o choca con otra franja del mentor"""
+    slot = rule_slot(slot_id)
+    if isinstance(slot, VirtualSlot) and not is_expanded(slot):
+        return None
+    return slot
+
+
+def materialized_or_overlap(template_id, slot_date):
+    """
+    Id de la fila ya materializada por otra petición; si no existe, la
+    instancia choca con otra franja y se lanza SlotOverlapError.
+    """
+    availability_id = db.session.query(MentorAvailability.id).filter_by(
+        template_id=template_id, date=slot_date
+    ).scalar()
+    if availability_id is None:
+        raise SlotOverlapError(OVERLAP_MESSAGE)
+    return availability_id
+
+
+def materialize_slot(slot_id):
+    """
+    Crear (o reutilizar) la fila de mentor_availability de un id virtual.
+    Retorna su id, o None si la instancia no existe. Lanza SlotOverlapError si
+    choca con otra franja del mentor. No hace commit.
+    """
+    slot = rule_slot(slot_id)
+    if slot is None or isinstance(slot, MentorAvailability):
+        return slot.id if slot is not None else None
+
+    template = slot.template
+    if not is_expanded(slot):
+        return materialized_or_overlap(template.id, slot.date)
+
+    availability = MentorAvailability(
+        mentor_id=template.mentor_id,
+        template_id=template.id,
+        date=slot.date,
+        start_time=template.start_time,
+        end_time=template.end_time,
+        session_type=template.session_type,
+        max_participants=template.max_participants,
+        is_available=True
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(availability)
+    except (IntegrityError, SlotOverlapError):
+        # Otra petición la materializó primero (unique_template_date) o choca
+        # con otra franja (restricción de exclusión en PostgreSQL,
+        # sync_slot_bounds en otros motores); el rollback del savepoint
+        # descarta la fila nueva
+        return materialized_or_overlap(template.id, slot.date)
+    return availability.id
+
+
+def sync_slot_bounds(mapper, connection, target):
+    """Calcular starts_at/ends_at y, fuera de PostgreSQL, rechazar solapamientos"""
+    target.starts_at, target.ends_at = slot_bounds(target.date, target.start_time, target.end_time)
+
+    if connection.dialect.name == 'postgresql' or target.is_available is False:
+        return
+
+    table = MentorAvailability.__table__
+    conflict = connection.execute(
+        select(table.c.id).where(
+            table.c.mentor_id == target.mentor_id,
+            table.c.is_available.is_(True),
+            table.c.id != target.id,
+            table.c.starts_at < target.ends_at,
+            table.c.starts_at > target.starts_at - MAX_SLOT_LENGTH,
+            table.c.ends_at > target.starts_at
+        ).limit(1)
+    ).first()
+    if conflict:
+        raise SlotOverlapError(OVERLAP_MESSAGE)
+
+
+event.listen(MentorAvailability, 'before_insert', sync_slot_bounds)
+event.listen(MentorAvailability, 'before_update', sync_slot_bounds)
+
+
+def check_template_overlap(mapper, connection, target):
+    """Rechazar plantillas activas cuyas instancias se solapan con otra plantilla activa del mentor"""
+    if target.is_active is False:
+        return
+
+    table = AvailabilityTemplate.__table__
+    others = connection.execute(
+        select(table).where(
+            table.c.mentor_id == target.mentor_id,
+            table.c.is_active.is_(True),
+            table.c.id != target.id,
+            or_(table.c.until.is_(None), table.c.until >= target.starts_on - timedelta(days=1))
+        )
+    ).all()
+    if target.until is not None:
+        others = [other for other in others if other.starts_on <= target.until + timedelta(days=1)]
+    if any(templates_overlap(target, other) for other in others):
+        raise SlotOverlapError('La plantilla se solapa con otra disponibilidad recurrente del mentor')
+
+
+event.listen(AvailabilityTemplate, 'before_insert', check_template_overlap)
+event.listen(AvailabilityTemplate, 'before_update', check_template_overlap)
+
+# Tablas nuevas (db.create_all) en PostgreSQL; en bases existentes lo crea la migración
+event.listen(
+    MentorAvailability.__table__, 'after_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql')
+)
+event.listen(
+    MentorAvailability.__table__, 'after_create',
+    DDL("""
+        ALTER TABLE mentor_availability ADD CONSTRAINT mentor_availability_no_overlap
+        EXCLUDE USING gist (mentor_id WITH =, tstzrange(starts_at, ends_at, '[)') WITH &&)
+        WHERE (is_available)
+    """).execute_if(dialect='postgresql')
+)
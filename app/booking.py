@@ -0,0 +1,252 @@
+"""
+Reservas de mentorías y registros a eventos sin condiciones de carrera.
+
+Los cupos se reservan con un UPDATE condicional sobre el contador
+mentor_availability.seats_taken:
+
+    UPDATE mentor_availability SET seats_taken = seats_taken + 1
+    WHERE id = :id AND is_available AND seats_taken < cupos
+
+La base serializa los UPDATE sobre la misma fila, por lo que dos peticiones
+concurrentes no pueden tomar el último cupo a la vez, y solo se bloquea la fila
+de esa disponibilidad. El índice único parcial uq_mentor_bookings_confirmed
+impide dos reservas confirmadas del mismo usuario en la misma disponibilidad.
+Reservar una instancia virtual de una plantilla ('tpl:...') la materializa
+primero (ver app.availability).
+
+Los eventos usan el mismo esquema con events.confirmed_count. Cuando el evento
+está lleno el registro queda en lista de espera; el camino lento (evento lleno
+y cancelaciones) bloquea la fila del evento con SELECT ... FOR UPDATE, así una
+cancelación promueve al primero de la lista de espera en la misma transacción
+sin competir con registros concurrentes.
+
+Las funciones no hacen commit; lo hace quien las llama.
+"""
+import uuid
+from datetime import datetime
+
+import pytz
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
+
+from app.availability import SEAT_CAPACITY, SlotOverlapError, materialize_slot, parse_virtual_slot_id
+from app.db import db, upsert_insert
+from app.models import MentorAvailability, MentorBooking, Event, EventRegistration
+
+bolivia_tz = pytz.timezone('America/La_Paz')
+
+
+class BookingError(Exception):
+    """La reserva no se puede realizar; status_code es el código HTTP sugerido"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def reserve_seat(availability_id):
+    """Tomar un cupo de la disponibilidad o lanzar BookingError"""
+    reserved = db.session.execute(
+        update(MentorAvailability)
+        .where(
+            MentorAvailability.id == availability_id,
+            MentorAvailability.is_available.is_(True),
+            MentorAvailability.seats_taken < SEAT_CAPACITY
+        )
+        .values(seats_taken=MentorAvailability.seats_taken + 1)
+        .returning(MentorAvailability.id)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+    if reserved:
+        return
+
+    # Sin fila actualizada: averiguar el motivo para el mensaje de error
+    availability = db.session.get(MentorAvailability, availability_id)
+    if availability is None:
+        raise BookingError('Disponibilidad no encontrada', 404)
+    if not availability.is_available:
+        raise BookingError('Esta disponibilidad ya no está disponible')
+    if availability.session_type == 'grupo':
+        raise BookingError('Esta sesión grupal está llena')
+    raise BookingError('Esta sesión ya está reservada')
+
+
+def release_seat(availability_id):
+    """Devolver un cupo a la disponibilidad"""
+    db.session.execute(
+        update(MentorAvailability)
+        .where(MentorAvailability.id == availability_id, MentorAvailability.seats_taken > 0)
+        .values(seats_taken=MentorAvailability.seats_taken - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def book_session(availability_id, user_id, notes=''):
+    """Crear una reserva confirmada. Lanza BookingError si no hay cupo."""
+    if parse_virtual_slot_id(availability_id) is not None:
+        try:
+            availability_id = materialize_slot(availability_id)
+        except SlotOverlapError as e:
+            raise BookingError(str(e), 409)
+        if availability_id is None:
+            raise BookingError('Disponibilidad no encontrada', 404)
+
+    reserve_seat(availability_id)
+
+    booking = MentorBooking(
+        id=str(uuid.uuid4()),
+        availability_id=availability_id,
+        user_id=user_id,
+        status='confirmed',
+        notes=notes
+    )
+    db.session.add(booking)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # uq_mentor_bookings_confirmed: el rollback también devuelve el cupo
+        db.session.rollback()
+        raise BookingError('Ya tienes una reserva para esta sesión')
+
+    return booking
+
+
+def cancel_session_booking(booking_id):
+    """Cancelar una reserva y liberar su cupo si estaba confirmada"""
+    cancelled = db.session.execute(
+        update(MentorBooking)
+        .where(MentorBooking.id == booking_id, MentorBooking.status == 'confirmed')
+        .values(status='cancelled')
+        .returning(MentorBooking.availability_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+    if cancelled:
+        release_seat(cancelled.availability_id)
+        return True
+
+    booking = db.session.get(MentorBooking, booking_id)
+    if booking is None:
+        raise BookingError('Reserva no encontrada', 404)
+    booking.status = 'cancelled'
+    return True
+
+
+def take_event_seat(event_id):
+    """Tomar un cupo del evento con un UPDATE condicional. Retorna True si hubo cupo."""
+    return db.session.execute(
+        update(Event)
+        .where(
+            Event.id == event_id,
+            or_(Event.max_participants.is_(None), Event.confirmed_count < Event.max_participants)
+        )
+        .values(confirmed_count=Event.confirmed_count + 1)
+        .returning(Event.id)
+        .execution_options(synchronize_session=False)
+    ).first() is not None
+
+
+def lock_event(event_id):
+    """Bloquear la fila del evento (FOR UPDATE) o lanzar BookingError"""
+    event = db.session.get(Event, event_id, with_for_update=True, populate_existing=True)
+    if event is None:
+        raise BookingError('Evento no encontrado', 404)
+    return event
+
+
+def upsert_registration(event_id, user_id, status, replace_statuses):
+    """
+    Insertar el registro del usuario con `status`, o cambiar a `status` uno
+    existente si su estado está en replace_statuses. Retorna el id del registro
+    o None si el existente no se modificó.
+    """
+    now = datetime.now(bolivia_tz)
+    stmt = upsert_insert(EventRegistration).values(
+        id=str(uuid.uuid4()),
+        event_id=event_id,
+        user_id=user_id,
+        status=status,
+        created_at=now
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['event_id', 'user_id'],
+        # created_at marca el orden en la lista de espera
+        set_={'status': status, 'created_at': now},
+        where=EventRegistration.status.in_(replace_statuses)
+    ).returning(EventRegistration.id)
+    row = db.session.execute(stmt).first()
+    return row.id if row else None
+
+
+def already_registered_error(event_id, user_id):
+    status = db.session.query(EventRegistration.status).filter_by(event_id=event_id, user_id=user_id).scalar()
+    if status == 'waitlist':
+        return BookingError('Ya estás en la lista de espera de este evento')
+    return BookingError('Ya estás registrado en este evento')
+
+
+def register_for_event(event_id, user_id):
+    """
+    Registrar al usuario en el evento: confirmado si hay cupo, en lista de
+    espera si está lleno. Lanza BookingError si ya está registrado.
+    """
+    seat = take_event_seat(event_id)
+    if not seat:
+        # Camino lento: bloquear el evento y volver a comprobar el cupo
+        event = lock_event(event_id)
+        seat = event.max_participants is None or event.confirmed_count < event.max_participants
+        if seat:
+            event.confirmed_count += 1
+
+    if seat:
+        registration_id = upsert_registration(event_id, user_id, 'confirmed', ['cancelled', 'waitlist'])
+    else:
+        registration_id = upsert_registration(event_id, user_id, 'waitlist', ['cancelled'])
+
+    if registration_id is None:
+        error = already_registered_error(event_id, user_id)
+        db.session.rollback()
+        raise error
+
+    registration = db.session.get(EventRegistration, registration_id, populate_existing=True)
+    return registration
+
+
+def promote_from_waitlist(event_id):
+    """Confirmar el registro más antiguo de la lista de espera. Retorna el registro o None."""
+    registration = EventRegistration.query.filter_by(
+        event_id=event_id, status='waitlist'
+    ).order_by(
+        EventRegistration.created_at, EventRegistration.id
+    ).with_for_update().first()
+
+    if registration is not None:
+        registration.status = 'confirmed'
+    return registration
+
+
+def cancel_event_registration(registration_id):
+    """
+    Cancelar un registro. Si estaba confirmado, su cupo pasa al primero de la
+    lista de espera o se libera. Retorna el registro promovido o None.
+    """
+    registration = db.session.get(EventRegistration, registration_id)
+    if registration is None:
+        raise BookingError('Registro no encontrado', 404)
+
+    event = lock_event(registration.event_id)
+    db.session.refresh(registration, with_for_update=True)
+
+    if registration.status == 'cancelled':
+        return None
+
+    was_confirmed = registration.status == 'confirmed'
+    registration.status = 'cancelled'
+    if not was_confirmed:
+        return None
+
+    promoted = promote_from_waitlist(event.id)
+    if promoted is None:
+        event.confirmed_count = max(0, event.confirmed_count - 1)
+    return promoted
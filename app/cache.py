@@ -0,0 +1,267 @@
+"""
+Capa de caché con backends intercambiables.
+
+`cache` se inicializa en create_app según CACHE_BACKEND:
+- 'memory': diccionario LRU con TTL en el proceso (un worker).
+- 'sqlite': archivo SQLite compartido por todos los workers de gunicorn del mismo host.
+- 'redis':  servidor Redis (o compatible) compartido entre hosts; requiere el paquete `redis`.
+
+Todas las rutas usan la misma API: get, set, delete, delete_prefix y get_or_set.
+Las claves son strings con prefijo por dominio (ej: 'catalog:courses:pre') y los
+valores deben ser serializables a JSON. Si el backend falla (archivo bloqueado,
+Redis caído) la fachada registra el error y se comporta como un fallo de caché:
+las rutas leen de la base de datos.
+"""
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCache:
+    """Caché LRU acotada con expiración por entrada, segura entre hilos"""
+
+    def __init__(self, maxsize=256, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        """Obtener un valor vigente o None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Guardar un valor y desalojar el menos usado si se supera maxsize"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Invalidar una entrada"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        """Invalidar todas las entradas cuya clave empieza con prefix"""
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        """Invalidar todas las entradas"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class SQLiteCache:
+    """
+    Caché en un archivo SQLite local. Todos los workers del mismo host abren el
+    mismo archivo, por lo que comparten entradas e invalidaciones.
+
+    Las lecturas no escriben (SQLite tiene un solo escritor por archivo): las
+    entradas vencen por TTL y, al superar maxsize, se desalojan las escritas
+    hace más tiempo. La purga corre cada PRUNE_INTERVAL escrituras del proceso,
+    así que maxsize puede superarse por poco entre purgas.
+    """
+
+    PRUNE_INTERVAL = 64
+
+    def __init__(self, path, maxsize=1024, ttl=600):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = itertools.count(1)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' expires_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL)'  # última escritura de la entrada
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_accessed_at ON cache (accessed_at)')
+
+    def _connection(self):
+        # Una conexión por hilo; WAL permite lectores concurrentes entre procesos
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        conn = self._connection()
+        conn.execute(
+            'INSERT INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, '
+            'expires_at = excluded.expires_at, accessed_at = excluded.accessed_at',
+            (key, json.dumps(value, default=str), expires_at, now)
+        )
+        if next(self._writes) % self.PRUNE_INTERVAL == 0:
+            self.prune(now)
+
+    def prune(self, now=None):
+        """Purgar vencidas y desalojar las escritas hace más tiempo si se supera maxsize"""
+        conn = self._connection()
+        conn.execute('DELETE FROM cache WHERE expires_at <= ?', (now or time.time(),))
+        (size,) = conn.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if size > self.maxsize:
+            conn.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY accessed_at LIMIT ?)',
+                (size - self.maxsize,)
+            )
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_prefix(self, prefix):
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        self._connection().execute("DELETE FROM cache WHERE key LIKE ? ESCAPE '\\'", (escaped + '%',))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+
+class RedisCache:
+    """Caché en Redis (o un servidor compatible). El desalojo lo maneja maxmemory-policy"""
+
+    def __init__(self, url, ttl=600, key_prefix='childfund:'):
+        try:
+            import redis # type: ignore
+        except ImportError as e:
+            raise RuntimeError('CACHE_BACKEND=redis requiere el paquete "redis"') from e
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+
+    def get(self, key):
+        value = self.client.get(self.key_prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.key_prefix + key, json.dumps(value, default=str), ex=int(self.ttl if ttl is None else ttl))
+
+    def delete(self, key):
+        self.client.delete(self.key_prefix + key)
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=self.key_prefix + prefix + '*', count=500))
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        self.delete_prefix('')
+
+
+class Cache:
+    """Fachada sobre el backend configurado, inicializada como extensión de Flask"""
+
+    def __init__(self, app=None):
+        self.backend = MemoryCache()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        ttl = app.config.get('CACHE_DEFAULT_TTL', 600)
+        maxsize = app.config.get('CACHE_MAXSIZE', 1024)
+
+        if backend == 'sqlite':
+            self.backend = SQLiteCache(app.config.get('CACHE_SQLITE_PATH'), maxsize=maxsize, ttl=ttl)
+        elif backend == 'redis':
+            self.backend = RedisCache(app.config.get('CACHE_REDIS_URL'), ttl=ttl)
+        elif backend == 'memory':
+            self.backend = MemoryCache(maxsize=maxsize, ttl=ttl)
+        else:
+            raise ValueError(f'CACHE_BACKEND desconocido: {backend}')
+
+        app.extensions['cache'] = self
+
+    def get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            print(f"Error reading cache key {key}: {str(e)}")
+            return None
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.backend.set(key, value, ttl)
+        except Exception as e:
+            print(f"Error writing cache key {key}: {str(e)}")
+
+    def delete(self, key):
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            print(f"Error deleting cache key {key}: {str(e)}")
+
+    def delete_prefix(self, prefix):
+        try:
+            self.backend.delete_prefix(prefix)
+        except Exception as e:
+            print(f"Error deleting cache prefix {prefix}: {str(e)}")
+
+    def clear(self):
+        self.backend.clear()
+
+    def get_or_set(self, key, loader, ttl=None):
+        """
+        Lectura a través de la caché: si no hay valor vigente se llama a
+        loader(). Los resultados None no se guardan (ej: recurso no encontrado).
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = loader()
+        if value is not None:
+            self.set(key, value, ttl)
+        return value
+
+
+cache = Cache()
+
+
+def compute_etag(payload):
+    """ETag estable para un cuerpo JSON serializable"""
+    raw = json.dumps(payload, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
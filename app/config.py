@@ -32,6 +32,37 @@ class Config:
     # Upload configuration for Render
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or '/opt/render/project/src/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    
+    # Caché compartida: 'memory' (un proceso), 'sqlite' (workers del mismo host) o 'redis'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite')
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH') or '/tmp/childfund-cache.sqlite3'
+    CACHE_REDIS_URL = os.environ.get('REDIS_URL')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+    CACHE_MAXSIZE = int(os.environ.get('CACHE_MAXSIZE', 1024))
+    
+    # TTL del catálogo de cursos (segundos)
+    CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 600))
+    
+    # TTL de las páginas del feed de la comunidad (segundos)
+    FEED_CACHE_TTL = int(os.environ.get('FEED_CACHE_TTL', 300))
+    
+    # Intervalo del job que procesa eventos de logros (0 desactiva el job)
+    OUTBOX_POLL_SECONDS = int(os.environ.get('OUTBOX_POLL_SECONDS', 10))
+    
+    # Intervalo del job que guarda los likes acumulados en memoria
+    LIKE_FLUSH_SECONDS = int(os.environ.get('LIKE_FLUSH_SECONDS', 5))
+    
+    # Intervalo del job que corrige contadores de likes desviados de community_likes
+    LIKE_RECONCILE_SECONDS = int(os.environ.get('LIKE_RECONCILE_SECONDS', 600))
+    
+    # Intervalo del job que recalcula hot_score de los posts (orden 'trending')
+    HOT_SCORE_SECONDS = int(os.environ.get('HOT_SCORE_SECONDS', 300))
+    
+    # Duración máxima de cada conexión SSE de actividad (el cliente reconecta)
+    LIVE_STREAM_SECONDS = int(os.environ.get('LIVE_STREAM_SECONDS', 55))
+    
+    # Streams SSE simultáneos por worker; cada uno ocupa un hilo de gunicorn
+    LIVE_MAX_STREAMS = int(os.environ.get('LIVE_MAX_STREAMS', 8))
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -3,3 +3,10 @@ from flask_sqlalchemy import SQLAlchemy
 # Configurar conexión con PostgreSQL
 db = SQLAlchemy()
 
+def upsert_insert(model):
+    """INSERT del dialecto activo (PostgreSQL o SQLite) con soporte de ON CONFLICT"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
@@ -0,0 +1,233 @@
+"""
+Feed de la comunidad precalculado en caché.
+
+Cada página del feed (por categoría o 'all', límite y cursor) se guarda en la
+caché con los datos del post y un extracto del contenido; el contenido completo
+se obtiene con GET /posts/<id>. Al crear, editar o borrar un post se invalidan
+los feeds de su categoría y 'all', y se recalcula su primera página
+(fan-out on write), así la mayoría de las lecturas no tocan community_posts
+salvo para los contadores.
+
+Los contadores (likes_count, comments_count) cambian con mucha frecuencia, por
+lo que no se guardan en caché: se leen por clave primaria para la página.
+
+Orden 'trending': por la columna indexada hot_score, que el job
+`recompute_hot_scores` del scheduler recalcula con una puntuación que decae con
+la antigüedad del post. Cada recálculo invalida las páginas 'trending'.
+"""
+import math
+from datetime import datetime, timedelta
+
+import pytz
+from flask import current_app
+from sqlalchemy import bindparam, event, inspect, update
+from sqlalchemy.orm import object_session
+
+from app.cache import cache
+from app.db import db
+from app.models import CommunityPost
+from app.pagination import paginate, DEFAULT_LIMIT
+
+bolivia_tz = pytz.timezone('America/La_Paz')
+
+FEED_PREFIX = 'feed:'
+
+FEED_ALL = 'all'
+
+SORT_RECENT = 'recent'
+SORT_TRENDING = 'trending'
+SORTS = (SORT_RECENT, SORT_TRENDING)
+
+# Caracteres del contenido que se incluyen en los listados
+EXCERPT_LENGTH = 280
+
+# Los posts más antiguos conservan su última puntuación
+TRENDING_WINDOW = timedelta(days=7)
+
+# Exponente de decaimiento por antigüedad (en horas)
+HOT_GRAVITY = 1.5
+
+# Cambio relativo mínimo para reescribir hot_score
+HOT_SCORE_TOLERANCE = 1e-3
+
+
+def feed_prefix(category=None, sort=SORT_RECENT):
+    return f'{FEED_PREFIX}{sort}:{category or FEED_ALL}:'
+
+
+def compute_hot_score(likes_count, comments_count, age_hours):
+    """Puntuación 'trending': interacciones divididas por la antigüedad con decaimiento"""
+    interactions = (likes_count or 0) + 2 * (comments_count or 0) + 1
+    return interactions / (max(age_hours, 0) + 2) ** HOT_GRAVITY
+
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    """Recortar el contenido a `length` caracteres sin partir palabras"""
+    content = content or ''
+    if len(content) <= length:
+        return content, False
+    excerpt = content[:length].rsplit(' ', 1)[0].rstrip()
+    return (excerpt or content[:length]) + '…', True
+
+
+def feed_item(post):
+    """Datos de un post para listados (sin contenido completo ni contadores)"""
+    excerpt, truncated = make_excerpt(post.content)
+    return {
+        'id': post.id,
+        'user_id': post.user_id,
+        'title': post.title,
+        'excerpt': excerpt,
+        'content_truncated': truncated,
+        'category': post.category,
+        'created_at': post.created_at.isoformat() if post.created_at else None,
+        'updated_at': post.updated_at.isoformat() if post.updated_at else None
+    }
+
+
+def load_feed_page(category=None, cursor=None, limit=DEFAULT_LIMIT, sort=SORT_RECENT):
+    """Leer de la base una página del feed: {'items': [...], 'next_cursor': ...}"""
+    query = CommunityPost.query
+    if category:
+        query = query.filter_by(category=category)
+
+    sort_column = CommunityPost.hot_score if sort == SORT_TRENDING else CommunityPost.created_at
+    posts, next_cursor = paginate(
+        query, sort_column, CommunityPost.id,
+        cursor=cursor, limit=limit, descending=True
+    )
+    return {'items': [feed_item(post) for post in posts], 'next_cursor': next_cursor}
+
+
+def get_feed_page(category=None, cursor=None, limit=DEFAULT_LIMIT, sort=SORT_RECENT):
+    """
+    Página del feed desde la caché, con los contadores actuales.
+    Retorna (items, next_cursor).
+    """
+    key = f'{feed_prefix(category, sort)}{limit}:{cursor or ""}'
+    page = cache.get_or_set(
+        key,
+        lambda: load_feed_page(category, cursor, limit, sort),
+        ttl=current_app.config.get('FEED_CACHE_TTL')
+    )
+
+    items = [dict(item) for item in page['items']]
+    if items:
+        counters = {
+            post_id: (likes_count, comments_count)
+            for post_id, likes_count, comments_count in db.session.query(
+                CommunityPost.id, CommunityPost.likes_count, CommunityPost.comments_count
+            ).filter(CommunityPost.id.in_([item['id'] for item in items])).all()
+        }
+        # Un post borrado después de cachear la página no se muestra
+        items = [item for item in items if item['id'] in counters]
+        for item in items:
+            item['likes_count'], item['comments_count'] = counters[item['id']]
+    return items, page['next_cursor']
+
+
+def invalidate_feed(*categories):
+    """Borrar de la caché todas las páginas de los feeds indicados y de 'all'"""
+    for sort in SORTS:
+        cache.delete_prefix(feed_prefix(None, sort))
+        for category in set(categories):
+            if category:
+                cache.delete_prefix(feed_prefix(category, sort))
+
+
+def refresh_feed(*categories):
+    """
+    Fan-out al escribir: invalidar los feeds afectados y recalcular su primera
+    página. Se llama después del commit.
+    """
+    try:
+        invalidate_feed(*categories)
+        for category in {None, *categories}:
+            key = f'{feed_prefix(category, SORT_RECENT)}{DEFAULT_LIMIT}:'
+            cache.set(key, load_feed_page(category), ttl=current_app.config.get('FEED_CACHE_TTL'))
+    except Exception as e:
+        # El cambio ya está guardado: la página se recalcula en la próxima lectura
+        print(f"Error refreshing feed: {str(e)}")
+
+
+def recompute_hot_scores():
+    """
+    Recalcular hot_score de los posts de los últimos TRENDING_WINDOW días e
+    invalidar las páginas 'trending'. Solo se escriben las puntuaciones que
+    cambiaron más de HOT_SCORE_TOLERANCE; los posts que salieron de la ventana
+    quedan con hot_score 0. Retorna el número de posts actualizados.
+    """
+    now = datetime.now(bolivia_tz)
+    cutoff = now - TRENDING_WINDOW
+    rows = db.session.query(
+        CommunityPost.id,
+        CommunityPost.likes_count,
+        CommunityPost.comments_count,
+        CommunityPost.created_at,
+        CommunityPost.hot_score
+    ).filter(CommunityPost.created_at >= cutoff).all()
+
+    scores = []
+    for post_id, likes_count, comments_count, created_at, hot_score in rows:
+        if created_at.tzinfo is None:
+            created_at = bolivia_tz.localize(created_at)
+        age_hours = (now - created_at).total_seconds() / 3600
+        score = compute_hot_score(likes_count, comments_count, age_hours)
+        if hot_score is None or not math.isclose(score, hot_score, rel_tol=HOT_SCORE_TOLERANCE):
+            scores.append({'post_id': post_id, 'score': score})
+
+    # UPDATE sobre la tabla: no es una edición del post, updated_at conserva su valor
+    posts = CommunityPost.__table__
+    if scores:
+        # Por clave primaria en lote (executemany)
+        db.session.execute(
+            update(posts)
+            .where(posts.c.id == bindparam('post_id'))
+            .values(hot_score=bindparam('score'), updated_at=posts.c.updated_at),
+            scores
+        )
+    # Sin esto un post viral que salió de la ventana seguiría primero en 'trending'
+    expired = db.session.execute(
+        update(posts)
+        .where(posts.c.created_at < cutoff, posts.c.hot_score != 0)
+        .values(hot_score=0, updated_at=posts.c.updated_at)
+    ).rowcount
+    db.session.commit()
+
+    updated = len(scores) + expired
+    if updated:
+        cache.delete_prefix(f'{FEED_PREFIX}{SORT_TRENDING}:')
+    return updated
+
+
+FEED_DIRTY_KEY = 'feed_dirty_categories'
+
+
+def mark_post_feeds_dirty(mapper, connection, target):
+    """Anotar en la sesión la categoría actual (y anterior) del post"""
+    session = object_session(target)
+    if session is None:
+        return
+    categories = session.info.setdefault(FEED_DIRTY_KEY, set())
+    categories.add(target.category)
+    categories.update(inspect(target).attrs.category.history.deleted or [])
+
+
+def invalidate_post_feeds(session):
+    """
+    Invalidar los feeds de los posts modificados tras el commit. Antes del
+    commit una lectura concurrente podría volver a cachear las filas anteriores.
+    """
+    categories = session.info.pop(FEED_DIRTY_KEY, None)
+    if categories:
+        invalidate_feed(*categories)
+
+
+def discard_post_feeds_dirty(session):
+    session.info.pop(FEED_DIRTY_KEY, None)
+
+
+for event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(CommunityPost, event_name, mark_post_feeds_dirty)
+event.listen(db.session, 'after_commit', invalidate_post_feeds)
+event.listen(db.session, 'after_rollback', discard_post_feeds_dirty)
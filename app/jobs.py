@@ -0,0 +1,125 @@
+"""
+Jobs en segundo plano del scheduler (APScheduler) y comandos para correrlos
+desde un proceso worker aparte.
+"""
+import atexit
+
+import click
+
+from app.db import db
+
+
+def process_outbox_job():
+    """Job del scheduler: procesar eventos de logros pendientes"""
+    from app import scheduler
+    from app.achievement_engine import process_outbox
+    
+    with scheduler.app.app_context():
+        try:
+            process_outbox()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error processing outbox: {str(e)}")
+
+
+def flush_like_counters_job():
+    """Job del scheduler: guardar los likes acumulados en memoria"""
+    from app import scheduler
+    from app.like_counter import flush_like_counters
+    
+    with scheduler.app.app_context():
+        try:
+            flush_like_counters()
+        except Exception as e:
+            print(f"Error flushing like counters: {str(e)}")
+
+
+def reconcile_like_counts_job():
+    """Job del scheduler: corregir contadores de likes desviados"""
+    from app import scheduler
+    from app.like_counter import reconcile_like_counts
+    
+    with scheduler.app.app_context():
+        try:
+            reconcile_like_counts()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error reconciling like counters: {str(e)}")
+
+
+def recompute_hot_scores_job():
+    """Job del scheduler: recalcular la puntuación 'trending' de los posts"""
+    from app import scheduler
+    from app.feed import recompute_hot_scores
+    
+    with scheduler.app.app_context():
+        try:
+            recompute_hot_scores()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error recomputing hot scores: {str(e)}")
+
+
+def register_jobs(app, scheduler):
+    """Registrar los jobs periódicos en el scheduler"""
+    if app.config.get('OUTBOX_POLL_SECONDS'):
+        scheduler.add_job(
+            id='process_outbox',
+            func=process_outbox_job,
+            trigger='interval',
+            seconds=app.config['OUTBOX_POLL_SECONDS'],
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+    
+    if app.config.get('LIKE_FLUSH_SECONDS'):
+        scheduler.add_job(
+            id='flush_like_counters',
+            func=flush_like_counters_job,
+            trigger='interval',
+            seconds=app.config['LIKE_FLUSH_SECONDS'],
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        
+        # Guardar lo pendiente al terminar el proceso
+        atexit.register(flush_like_counters_job)
+    
+    if app.config.get('LIKE_RECONCILE_SECONDS'):
+        scheduler.add_job(
+            id='reconcile_like_counts',
+            func=reconcile_like_counts_job,
+            trigger='interval',
+            seconds=app.config['LIKE_RECONCILE_SECONDS'],
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+    
+    if app.config.get('HOT_SCORE_SECONDS'):
+        scheduler.add_job(
+            id='recompute_hot_scores',
+            func=recompute_hot_scores_job,
+            trigger='interval',
+            seconds=app.config['HOT_SCORE_SECONDS'],
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+    
+    @app.cli.command('process-outbox')
+    @click.option('--loop', is_flag=True, help='Seguir procesando cada OUTBOX_POLL_SECONDS')
+    def process_outbox_command(loop):
+        """Procesar eventos de logros pendientes (para un worker dedicado)"""
+        import time
+        from app.achievement_engine import process_outbox
+        
+        while True:
+            processed = process_outbox()
+            click.echo(f"✅ {processed} eventos procesados")
+            if not loop:
+                break
+            if processed == 0:
+                time.sleep(app.config.get('OUTBOX_POLL_SECONDS') or 5)
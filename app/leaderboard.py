@@ -0,0 +1,184 @@
+"""
+Tablas de posiciones por puntos de logros.
+
+Fuente de verdad: la tabla leaderboard_entries (board, user_id, points), donde
+board es 'global', 'route:<pre|inc>' o 'category:<categoría>'. Se escribe al
+desbloquear logros (ver achievement_engine.update_user_stats).
+
+Lectura: cada proceso mantiene por tablero una lista ordenada por
+(-points, user_id) que se refresca con los deltas (filas con updated_at
+posterior a la última sincronización). El top-N es un slice y la posición de
+un usuario se obtiene con búsqueda binaria: O(log n).
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+import pytz
+
+from app.db import db, upsert_insert
+from app.models import (
+    Achievement, UserAchievement, LeaderboardEntry, LearningCourse, UserCourseProgress
+)
+
+bolivia_tz = pytz.timezone('America/La_Paz')
+
+BOARD_GLOBAL = 'global'
+
+# Margen al pedir deltas, para no perder filas de transacciones que hicieron
+# commit después de la sincronización con un updated_at anterior
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def route_board(route_type):
+    return f'route:{route_type}'
+
+
+def category_board(category):
+    return f'category:{category or "otros"}'
+
+
+def record_user_points(user_id, total_points):
+    """
+    Escribir los puntos actuales del usuario en sus tableros: global, cada ruta
+    en la que tiene cursos y cada categoría. Se llama con la fila de
+    estadísticas bloqueada, por lo que los valores absolutos son consistentes.
+    No hace commit.
+    """
+    now = datetime.now(bolivia_tz)
+    points_by_board = {BOARD_GLOBAL: total_points}
+
+    route_types = db.session.query(LearningCourse.route_type).join(
+        UserCourseProgress, UserCourseProgress.course_id == LearningCourse.id
+    ).filter(UserCourseProgress.user_id == user_id).distinct().all()
+    for (route_type,) in route_types:
+        points_by_board[route_board(route_type)] = total_points
+
+    category_points = db.session.query(
+        Achievement.category,
+        db.func.coalesce(db.func.sum(Achievement.points), 0)
+    ).join(
+        UserAchievement, UserAchievement.achievement_id == Achievement.id
+    ).filter(
+        UserAchievement.user_id == user_id,
+        UserAchievement.progress >= 100
+    ).group_by(Achievement.category).all()
+    for category, points in category_points:
+        board = category_board(category)
+        points_by_board[board] = points_by_board.get(board, 0) + int(points)
+
+    stmt = upsert_insert(LeaderboardEntry).values([
+        {'board': board, 'user_id': user_id, 'points': points, 'updated_at': now}
+        for board, points in points_by_board.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['board', 'user_id'],
+        set_={'points': stmt.excluded.points, 'updated_at': stmt.excluded.updated_at}
+    )
+    db.session.execute(stmt)
+
+
+class SortedBoard:
+    """
+    Tablero ordenado por (-points, user_id) con posición por búsqueda binaria.
+    Las lecturas toman el mismo lock que las actualizaciones para no ver la
+    lista a medio modificar.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._points = {}
+        self._lock = threading.Lock()
+
+    def update(self, user_id, points):
+        with self._lock:
+            old = self._points.get(user_id)
+            if old == points:
+                return
+            if old is not None:
+                index = bisect_left(self._keys, (-old, user_id))
+                del self._keys[index]
+            insort(self._keys, (-points, user_id))
+            self._points[user_id] = points
+
+    def top(self, limit):
+        """Primeros `limit` usuarios con su posición (empates comparten posición)"""
+        with self._lock:
+            keys = self._keys[:limit]
+        entries = []
+        for index, (neg_points, user_id) in enumerate(keys):
+            rank = index + 1
+            if entries and entries[-1]['points'] == -neg_points:
+                rank = entries[-1]['rank']
+            entries.append({'rank': rank, 'user_id': user_id, 'points': -neg_points})
+        return entries
+
+    def rank(self, user_id):
+        """Posición del usuario: 1 + usuarios con más puntos"""
+        with self._lock:
+            points = self._points.get(user_id)
+            if points is None:
+                return None
+            position = bisect_left(self._keys, (-points, '')) + 1
+        return {
+            'rank': position,
+            'user_id': user_id,
+            'points': points
+        }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)
+
+
+class LeaderboardIndex:
+    """Tableros en memoria del proceso, refrescados desde leaderboard_entries"""
+
+    def __init__(self, sync_seconds=5):
+        self.sync_seconds = sync_seconds
+        self._boards = {}
+        self._watermark = None
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def sync(self, force=False):
+        """Aplicar las filas modificadas desde la última sincronización"""
+        if not force and self._synced_at is not None and time.monotonic() - self._synced_at < self.sync_seconds:
+            return
+        with self._lock:
+            query = db.session.query(
+                LeaderboardEntry.board,
+                LeaderboardEntry.user_id,
+                LeaderboardEntry.points,
+                LeaderboardEntry.updated_at
+            )
+            if self._watermark is not None:
+                query = query.filter(LeaderboardEntry.updated_at > self._watermark - SYNC_OVERLAP)
+
+            watermark = self._watermark
+            for board, user_id, points, updated_at in query.all():
+                self._boards.setdefault(board, SortedBoard()).update(user_id, points)
+                if updated_at is not None and (watermark is None or updated_at > watermark):
+                    watermark = updated_at
+
+            self._watermark = watermark
+            self._synced_at = time.monotonic()
+
+    def top(self, board, limit=10):
+        self.sync()
+        sorted_board = self._boards.get(board)
+        return sorted_board.top(limit) if sorted_board else []
+
+    def rank(self, board, user_id):
+        self.sync()
+        sorted_board = self._boards.get(board)
+        return sorted_board.rank(user_id) if sorted_board else None
+
+    def size(self, board):
+        self.sync()
+        sorted_board = self._boards.get(board)
+        return len(sorted_board) if sorted_board else 0
+
+
+leaderboard_index = LeaderboardIndex()
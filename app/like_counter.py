@@ -0,0 +1,127 @@
+"""
+Contador de likes con escritura diferida (write-behind).
+
+toggle_like sigue insertando/borrando la fila de community_likes (que garantiza
+un like por usuario), pero no toca community_posts.likes_count: el cambio
+(+1 / -1) se acumula en memoria por post. El job `flush_like_counters` del
+scheduler recalcula en lote el contador de los posts modificados a partir de
+COUNT(community_likes), con un solo UPDATE, así un post viral no bloquea su
+fila en cada like y el resultado no depende de que los deltas lleguen todos.
+
+Las lecturas suman el delta pendiente del proceso (pending) al valor guardado;
+entre workers la diferencia dura como máximo LIKE_FLUSH_SECONDS.
+
+Los deltas en memoria se pierden si el proceso muere sin apagarse limpiamente
+(timeout de gunicorn, SIGKILL, OOM). El job `reconcile_like_counts` corrige
+periódicamente los posts cuyo contador no coincide con community_likes.
+"""
+import threading
+
+from sqlalchemy import func, select, update
+
+from app.db import db
+from app.models import CommunityLike, CommunityPost
+
+
+class LikeCounterBuffer:
+    """
+    Deltas de likes pendientes por post, protegidos con un lock. Los deltas
+    que se están guardando (entre drain y complete/restore) se siguen contando
+    en pending, así las lecturas no pierden likes durante el flush.
+    """
+
+    def __init__(self):
+        self._deltas = {}
+        self._flushing = {}
+        self._lock = threading.Lock()
+
+    def add(self, post_id, delta):
+        with self._lock:
+            self._add(self._deltas, post_id, delta)
+
+    @staticmethod
+    def _add(deltas, post_id, delta):
+        value = deltas.get(post_id, 0) + delta
+        if value:
+            deltas[post_id] = value
+        else:
+            deltas.pop(post_id, None)
+
+    def pending(self, post_id):
+        """Delta aún no guardado para el post"""
+        with self._lock:
+            return self._deltas.get(post_id, 0) + self._flushing.get(post_id, 0)
+
+    def drain(self):
+        """Tomar todos los deltas pendientes y dejar el buffer vacío"""
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+            self._flushing = dict(deltas)
+        return deltas
+
+    def complete(self):
+        """Los deltas tomados con drain ya están guardados"""
+        with self._lock:
+            self._flushing = {}
+
+    def restore(self, deltas):
+        """Devolver al buffer deltas que no se pudieron guardar"""
+        with self._lock:
+            self._flushing = {}
+            for post_id, delta in deltas.items():
+                self._add(self._deltas, post_id, delta)
+
+
+like_counter = LikeCounterBuffer()
+
+
+def counted_likes():
+    """Subconsulta correlacionada: likes guardados del post"""
+    return select(func.count(CommunityLike.id)).where(
+        CommunityLike.post_id == CommunityPost.id
+    ).correlate(CommunityPost).scalar_subquery()
+
+
+def flush_like_counters():
+    """
+    Recalcular community_posts.likes_count de los posts con likes pendientes.
+    Retorna el número de posts actualizados. Si falla, los deltas vuelven al
+    buffer para el siguiente intento.
+    """
+    deltas = like_counter.drain()
+    if not deltas:
+        return 0
+
+    try:
+        # El contador no es una edición del post: updated_at conserva su valor
+        db.session.execute(
+            update(CommunityPost)
+            .where(CommunityPost.id.in_(list(deltas)))
+            .values(likes_count=counted_likes(), updated_at=CommunityPost.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        like_counter.complete()
+    except Exception:
+        db.session.rollback()
+        like_counter.restore(deltas)
+        raise
+
+    return len(deltas)
+
+
+def reconcile_like_counts():
+    """
+    Corregir likes_count de los posts cuyo valor no coincide con
+    COUNT(community_likes) (deltas perdidos al morir un worker).
+    Retorna el número de posts corregidos.
+    """
+    likes = counted_likes()
+    result = db.session.execute(
+        update(CommunityPost)
+        .where(func.coalesce(CommunityPost.likes_count, 0) != likes)
+        .values(likes_count=likes, updated_at=CommunityPost.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,212 @@
+"""
+Actividad de la comunidad en vivo (Server-Sent Events).
+
+Las rutas publican eventos (post creado, comentario, cambio de likes) con
+`publish_activity` antes de su commit. Cada evento lleva los canales a los que
+pertenece: 'all', 'category:<categoría>' y 'post:<id>'.
+
+- En PostgreSQL el evento se envía con pg_notify dentro de la transacción, por
+  lo que solo se entrega si hay commit. Cada worker que tiene clientes
+  conectados mantiene una conexión con LISTEN y reenvía las notificaciones a su
+  bus local: así todos los workers de gunicorn reciben todos los eventos.
+- En otros motores (SQLite local, un solo proceso) el evento se guarda en la
+  sesión y se entrega al bus local después del commit.
+
+El bus en memoria (ActivityBus) reparte cada evento a las suscripciones de los
+streams abiertos del proceso, cada una con su propia cola. Cada stream ocupa un
+hilo del worker, por eso el número de suscripciones por proceso tiene un límite
+(LIVE_MAX_STREAMS): al alcanzarlo la ruta responde 503 y el cliente reintenta.
+"""
+import json
+import queue
+import select
+import threading
+import time
+
+from sqlalchemy import event, text
+
+from app.db import db
+
+NOTIFY_CHANNEL = 'community_activity'
+
+CHANNEL_ALL = 'all'
+
+# Eventos en cola por cliente antes de descartar los más nuevos
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Segundos entre comentarios de keep-alive en el stream
+HEARTBEAT_SECONDS = 15
+
+# Milisegundos antes de reconectar: stream terminado / límite de streams alcanzado
+RETRY_MS = 3000
+BUSY_RETRY_MS = 10000
+
+# Clave de session.info con los eventos pendientes de commit (sin PostgreSQL)
+PENDING_KEY = 'live_pending_activity'
+
+
+def category_channel(category):
+    return f'category:{category}'
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+class Subscription:
+    """Cola de eventos de un stream para un conjunto de canales"""
+
+    def __init__(self, channels):
+        self.channels = set(channels)
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class ActivityBus:
+    """Pub/sub en memoria del proceso"""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def subscribe(self, channels, limit=None):
+        """Nueva suscripción, o None si ya hay `limit` abiertas"""
+        subscription = Subscription(channels)
+        with self._lock:
+            if limit and len(self._subscriptions) >= limit:
+                return None
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, message):
+        channels = set(message.get('channels') or [])
+        with self._lock:
+            subscriptions = [s for s in self._subscriptions if s.channels & channels]
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                # Cliente lento: se pierde el evento, no se bloquea al resto
+                pass
+
+    def ensure_listener(self, app):
+        """Iniciar (una vez por proceso) el LISTEN de PostgreSQL"""
+        if self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is None:
+                with app.app_context():
+                    if db.engine.dialect.name != 'postgresql':
+                        self._listener = False
+                        return
+                self._listener = PostgresListener(app, self)
+                self._listener.start()
+
+
+class PostgresListener(threading.Thread):
+    """Hilo que escucha NOTIFY_CHANNEL y publica en el bus local"""
+
+    def __init__(self, app, bus):
+        super().__init__(name='community-activity-listener', daemon=True)
+        self.app = app
+        self.bus = bus
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except Exception as e:
+                print(f"Error in activity listener: {str(e)}")
+                time.sleep(5)
+
+    def listen(self):
+        with self.app.app_context():
+            # Conexión propia, fuera del pool, en modo autocommit
+            raw = db.engine.raw_connection()
+            raw.detach()
+        connection = raw.driver_connection
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+            while True:
+                if select.select([connection], [], [], HEARTBEAT_SECONDS) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    self.bus.publish(json.loads(notify.payload))
+        finally:
+            connection.close()
+
+
+activity_bus = ActivityBus()
+
+
+def publish_activity(event_type, data, channels):
+    """
+    Publicar un evento de actividad. Se llama antes del commit de la petición:
+    solo se entrega si la transacción se confirma.
+    """
+    message = {'type': event_type, 'channels': [CHANNEL_ALL, *channels], 'data': data}
+
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(
+            text('SELECT pg_notify(:channel, :payload)'),
+            {'channel': NOTIFY_CHANNEL, 'payload': json.dumps(message)}
+        )
+    else:
+        db.session.info.setdefault(PENDING_KEY, []).append(message)
+
+
+def deliver_pending(session):
+    for message in session.info.pop(PENDING_KEY, []):
+        activity_bus.publish(message)
+
+
+def discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+event.listen(db.session, 'after_commit', deliver_pending)
+event.listen(db.session, 'after_rollback', discard_pending)
+
+
+def format_sse(message):
+    """Serializar un evento en formato text/event-stream"""
+    return f"event: {message['type']}\ndata: {json.dumps(message['data'])}\n\n"
+
+
+def open_activity_stream(app, channels, max_streams=None):
+    """
+    Suscribirse a los canales pedidos para un stream. Retorna None si el
+    proceso ya tiene max_streams streams abiertos.
+    """
+    activity_bus.ensure_listener(app)
+    return activity_bus.subscribe(channels, limit=max_streams)
+
+
+def stream_activity(subscription, max_seconds):
+    """
+    Generador del stream SSE: eventos de la suscripción y un comentario de
+    keep-alive cada HEARTBEAT_SECONDS. Termina tras max_seconds (EventSource
+    reconecta solo) y libera la suscripción.
+    """
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        while time.monotonic() < deadline:
+            message = subscription.get(timeout=min(HEARTBEAT_SECONDS, max(deadline - time.monotonic(), 0.1)))
+            yield format_sse(message) if message else ': keep-alive\n\n'
+    finally:
+        activity_bus.unsubscribe(subscription)
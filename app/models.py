@@ -26,6 +26,10 @@ class LearningCourse(db.Model):
     sections = db.relationship('LearningSection', back_populates='course', cascade='all, delete-orphan')
     user_progress = db.relationship('UserCourseProgress', back_populates='course', cascade='all, delete-orphan', foreign_keys='UserCourseProgress.course_id')
     
+    __table_args__ = (
+        db.Index('ix_learning_courses_route_order', 'route_type', 'order_number'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -55,6 +59,10 @@ class LearningSection(db.Model):
     course = db.relationship('LearningCourse', back_populates='sections')
     user_progress = db.relationship('UserSectionProgress', back_populates='section', cascade='all, delete-orphan', foreign_keys='UserSectionProgress.section_id')
     
+    __table_args__ = (
+        db.Index('ix_learning_sections_course_order', 'course_id', 'order_number'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -85,6 +93,7 @@ class UserCourseProgress(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('user_id', 'course_id', name='unique_user_course'),
+        db.Index('ix_user_course_progress_course_id', 'course_id'),
     )
     
     def to_dict(self):
@@ -114,6 +123,7 @@ class UserSectionProgress(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('user_id', 'section_id', name='unique_user_section'),
+        db.Index('ix_user_section_progress_section_id', 'section_id'),
     )
     
     def to_dict(self):
@@ -144,6 +154,11 @@ class Transaction(db.Model):
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(bolivia_tz))
     updated_at = db.Column(db.DateTime(timezone=True), onupdate=lambda: datetime.now(bolivia_tz))
     
+    __table_args__ = (
+        db.Index('ix_transactions_user_date', 'user_id', 'date'),
+        db.Index('ix_transactions_user_type_category', 'user_id', 'type', 'category'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -172,6 +187,7 @@ class CommunityPost(db.Model):
     category = db.Column(db.String(50), nullable=False)  # experiencia, curiosidad, pregunta, etc.
     likes_count = db.Column(db.Integer, default=0)
     comments_count = db.Column(db.Integer, default=0)
+    hot_score = db.Column(db.Float, nullable=False, default=0, server_default='0')  # Recalculado por el scheduler (ver app.feed)
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(bolivia_tz))
     updated_at = db.Column(db.DateTime(timezone=True), onupdate=lambda: datetime.now(bolivia_tz))
     
@@ -179,14 +195,23 @@ class CommunityPost(db.Model):
     comments = db.relationship('CommunityComment', back_populates='post', cascade='all, delete-orphan')
     likes = db.relationship('CommunityLike', back_populates='post', cascade='all, delete-orphan')
     
-    def to_dict(self):
+    __table_args__ = (
+        db.Index('ix_community_posts_category_created', 'category', 'created_at'),
+        db.Index('ix_community_posts_created_at', 'created_at'),
+        db.Index('ix_community_posts_user_id', 'user_id'),
+        db.Index('ix_community_posts_hot', 'hot_score', 'id'),
+        db.Index('ix_community_posts_category_hot', 'category', 'hot_score', 'id'),
+    )
+    
+    def to_dict(self, likes_pending=0):
+        # likes_pending: likes aún no guardados (ver app.like_counter)
         return {
             'id': self.id,
             'user_id': self.user_id,
             'title': self.title,
             'content': self.content,
             'category': self.category,
-            'likes_count': self.likes_count,
+            'likes_count': max(0, (self.likes_count or 0) + likes_pending),
             'comments_count': self.comments_count,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
@@ -205,6 +230,10 @@ class CommunityComment(db.Model):
     # Relaciones
     post = db.relationship('CommunityPost', back_populates='comments')
     
+    __table_args__ = (
+        db.Index('ix_community_comments_post_created', 'post_id', 'created_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -258,6 +287,10 @@ class Achievement(db.Model):
     # Relaciones
     user_achievements = db.relationship('UserAchievement', back_populates='achievement', cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_achievements_requirement', 'requirement_type', 'requirement_value'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -285,6 +318,7 @@ class UserAchievement(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('user_id', 'achievement_id', name='unique_user_achievement'),
+        db.Index('ix_user_achievements_achievement_id', 'achievement_id'),
     )
     
     def to_dict(self):
@@ -297,20 +331,111 @@ class UserAchievement(db.Model):
             'achievement': self.achievement.to_dict() if self.achievement else None
         }
 
+class UserAchievementStats(db.Model):
+    __tablename__ = 'user_achievement_stats'
+    
+    # Estadísticas materializadas por usuario; se actualizan al desbloquear logros
+    user_id = db.Column(db.String(36), primary_key=True)  # ID del usuario de Supabase
+    total_points = db.Column(db.Integer, nullable=False, default=0)
+    unlocked_count = db.Column(db.Integer, nullable=False, default=0)
+    by_category = db.Column(db.JSON, nullable=False, default=dict)  # {categoría: logros desbloqueados}
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(bolivia_tz), onupdate=lambda: datetime.now(bolivia_tz))
+    
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'total_points': self.total_points,
+            'unlocked_count': self.unlocked_count,
+            'by_category': self.by_category or {},
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class LeaderboardEntry(db.Model):
+    __tablename__ = 'leaderboard_entries'
+    
+    board = db.Column(db.String(80), primary_key=True)  # 'global', 'route:pre', 'category:ventas', etc.
+    user_id = db.Column(db.String(36), primary_key=True)  # ID del usuario de Supabase
+    points = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(bolivia_tz), onupdate=lambda: datetime.now(bolivia_tz))
+    
+    __table_args__ = (
+        db.Index('ix_leaderboard_entries_board_points', 'board', 'points', 'user_id'),
+        db.Index('ix_leaderboard_entries_updated_at', 'updated_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'board': self.board,
+            'user_id': self.user_id,
+            'points': self.points,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
 # ============================================
 # MODELOS DE CALENDARIO Y EVENTOS
 # ============================================
 
+class AvailabilityTemplate(db.Model):
+    """Disponibilidad semanal recurrente (estilo RRULE FREQ=WEEKLY) de un mentor"""
+    __tablename__ = 'availability_templates'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    mentor_id = db.Column(db.String(36), nullable=False)
+    weekdays = db.Column(db.String(20), nullable=False)  # BYDAY: 'MO,WE,FR'
+    interval_weeks = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # INTERVAL
+    starts_on = db.Column(db.Date, nullable=False)  # DTSTART
+    until = db.Column(db.Date)  # UNTIL (inclusive), None = sin fin
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    session_type = db.Column(db.String(20), nullable=False)  # 'individual' o 'grupo'
+    max_participants = db.Column(db.Integer, default=1)
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(bolivia_tz))
+    updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(bolivia_tz), onupdate=lambda: datetime.now(bolivia_tz))
+    
+    __table_args__ = (
+        db.Index('ix_availability_templates_mentor', 'mentor_id'),
+    )
+    
+    @property
+    def rrule(self):
+        rule = f'FREQ=WEEKLY;INTERVAL={self.interval_weeks or 1};BYDAY={self.weekdays}'
+        if self.until:
+            rule += f';UNTIL={self.until.strftime("%Y%m%d")}'
+        return rule
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'mentor_id': self.mentor_id,
+            'rrule': self.rrule,
+            'weekdays': self.weekdays.split(','),
+            'interval_weeks': self.interval_weeks,
+            'starts_on': self.starts_on.isoformat() if self.starts_on else None,
+            'until': self.until.isoformat() if self.until else None,
+            'start_time': self.start_time.strftime('%H:%M') if self.start_time else None,
+            'end_time': self.end_time.strftime('%H:%M') if self.end_time else None,
+            'session_type': self.session_type,
+            'max_participants': self.max_participants,
+            'is_active': self.is_active,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
 class MentorAvailability(db.Model):
     __tablename__ = 'mentor_availability'
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     mentor_id = db.Column(db.String(36), nullable=False)  # ID del mentor (puede ser user_id de Supabase)
+    template_id = db.Column(db.String(36), db.ForeignKey('availability_templates.id', ondelete='SET NULL'))  # Instancia materializada de una plantilla
     date = db.Column(db.Date, nullable=False)
     start_time = db.Column(db.Time, nullable=False)
     end_time = db.Column(db.Time, nullable=False)
+    starts_at = db.Column(db.DateTime(timezone=True), nullable=False)  # date + start_time (ver app.availability)
+    ends_at = db.Column(db.DateTime(timezone=True), nullable=False)  # date + end_time
     session_type = db.Column(db.String(20), nullable=False)  # 'individual' o 'grupo'
     max_participants = db.Column(db.Integer, default=1)  # Para sesiones grupales
+    seats_taken = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Reservas confirmadas (ver app.booking)
     is_available = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(bolivia_tz))
     updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(bolivia_tz), onupdate=lambda: datetime.now(bolivia_tz))
@@ -318,17 +443,26 @@ class MentorAvailability(db.Model):
     # Relaciones
     bookings = db.relationship('MentorBooking', back_populates='availability', cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_mentor_availability_mentor_starts', 'mentor_id', 'starts_at'),
+        db.Index('ix_mentor_availability_starts', 'starts_at'),
+        db.UniqueConstraint('template_id', 'date', name='unique_template_date'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
             'mentor_id': self.mentor_id,
+            'template_id': self.template_id,
             'date': self.date.isoformat() if self.date else None,
             'start_time': self.start_time.strftime('%H:%M') if self.start_time else None,
             'end_time': self.end_time.strftime('%H:%M') if self.end_time else None,
+            'starts_at': self.starts_at.isoformat() if self.starts_at else None,
+            'ends_at': self.ends_at.isoformat() if self.ends_at else None,
             'session_type': self.session_type,
             'max_participants': self.max_participants,
             'is_available': self.is_available,
-            'booked_count': len([b for b in self.bookings if b.status == 'confirmed']),
+            'booked_count': self.seats_taken or 0,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -347,6 +481,17 @@ class MentorBooking(db.Model):
     # Relaciones
     availability = db.relationship('MentorAvailability', back_populates='bookings')
     
+    __table_args__ = (
+        db.Index('ix_mentor_bookings_user_created', 'user_id', 'created_at'),
+        db.Index('ix_mentor_bookings_availability_status', 'availability_id', 'status'),
+        # Una sola reserva confirmada por usuario y disponibilidad
+        db.Index(
+            'uq_mentor_bookings_confirmed', 'availability_id', 'user_id', unique=True,
+            postgresql_where=db.text("status = 'confirmed'"),
+            sqlite_where=db.text("status = 'confirmed'")
+        ),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -371,6 +516,7 @@ class Event(db.Model):
     location = db.Column(db.String(255))  # Presencial o URL para virtual
     is_virtual = db.Column(db.Boolean, default=False)
     max_participants = db.Column(db.Integer)
+    confirmed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Registros confirmados (ver app.booking)
     organizer_id = db.Column(db.String(36))  # ID del organizador
     image_url = db.Column(db.String(500))
     registration_url = db.Column(db.String(500))
@@ -380,6 +526,10 @@ class Event(db.Model):
     # Relaciones
     registrations = db.relationship('EventRegistration', back_populates='event', cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_events_start_date', 'start_date'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -394,7 +544,7 @@ class Event(db.Model):
             'organizer_id': self.organizer_id,
             'image_url': self.image_url,
             'registration_url': self.registration_url,
-            'registered_count': len([r for r in self.registrations if r.status == 'confirmed']),
+            'registered_count': self.confirmed_count or 0,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -413,6 +563,8 @@ class EventRegistration(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('event_id', 'user_id', name='unique_event_registration'),
+        db.Index('ix_event_registrations_user_created', 'user_id', 'created_at'),
+        db.Index('ix_event_registrations_event_status', 'event_id', 'status'),
     )
     
     def to_dict(self):
@@ -423,4 +575,35 @@ class EventRegistration(db.Model):
             'status': self.status,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'event': self.event.to_dict() if self.event else None
-        }
\ No newline at end of file
+        }
+# ============================================
+# MODELOS DE EVENTOS DE DOMINIO (OUTBOX)
+# ============================================
+
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox_events'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), nullable=False)
+    event_type = db.Column(db.String(50), nullable=False)  # course_completed, transaction_created, post_created
+    event_value = db.Column(db.String(255))  # course_id, tipo de transacción, post_id
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(bolivia_tz))
+    processed_at = db.Column(db.DateTime(timezone=True))
+    
+    __table_args__ = (
+        db.Index('ix_outbox_events_pending', 'processed_at', 'created_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'event_type': self.event_type,
+            'event_value': self.event_value,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
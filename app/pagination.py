@@ -0,0 +1,89 @@
+"""
+Paginación por cursor (keyset) compartida por las rutas.
+
+En lugar de LIMIT/OFFSET se pagina sobre (columna_de_orden, id): cada página
+filtra con `(orden, id) < (último_orden, último_id)`, por lo que la página N
+cuesta lo mismo que la primera. El cursor es opaco para el cliente.
+"""
+import base64
+import json
+from datetime import datetime, date
+
+from flask import request
+from sqlalchemy import tuple_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 100
+
+
+class InvalidCursor(ValueError):
+    """El cursor recibido no es válido"""
+
+
+def encode_cursor(sort_value, row_id):
+    """Codificar la posición (valor de orden, id) en un cursor opaco"""
+    if isinstance(sort_value, datetime):
+        payload = {'t': 'datetime', 'v': sort_value.isoformat()}
+    elif isinstance(sort_value, date):
+        payload = {'t': 'date', 'v': sort_value.isoformat()}
+    else:
+        payload = {'t': 'raw', 'v': sort_value}
+    payload['id'] = row_id
+
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decodificar un cursor en (valor de orden, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value = payload['v']
+        if payload['t'] == 'datetime':
+            value = datetime.fromisoformat(value)
+        elif payload['t'] == 'date':
+            value = date.fromisoformat(value)
+        return value, payload['id']
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor('cursor inválido') from e
+
+
+def get_page_args():
+    """Leer cursor y limit de los query params de la petición"""
+    cursor = request.args.get('cursor') or None
+    limit = request.args.get('limit', type=int, default=DEFAULT_LIMIT)
+    limit = max(1, min(limit, MAX_LIMIT))
+    return cursor, limit
+
+
+def paginate(query, sort_column, id_column, cursor=None, limit=DEFAULT_LIMIT, descending=False):
+    """
+    Paginar una consulta por (sort_column, id_column).
+    Retorna (items, next_cursor); next_cursor es None en la última página.
+    """
+    key = tuple_(sort_column, id_column)
+
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(key < tuple_(sort_value, last_id))
+        else:
+            query = query.filter(key > tuple_(sort_value, last_id))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    # Pedir una fila extra para saber si hay más páginas
+    items = query.limit(limit + 1).all()
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+    return items, next_cursor
@@ -0,0 +1,140 @@
+"""
+Verificación de planes de consulta.
+
+Cada entrada de QUERY_PLAN_CHECKS reproduce la forma de la consulta que usa una
+ruta y el índice que debería resolverla. `flask check-indexes` ejecuta EXPLAIN
+sobre cada una e informa si el planificador usa un índice.
+"""
+from datetime import datetime
+
+import click
+from sqlalchemy import select, func, desc
+
+from app.db import db
+from app.models import (
+    LearningCourse, LearningSection,
+    UserCourseProgress, UserSectionProgress,
+    Transaction,
+    CommunityPost, CommunityComment, CommunityLike,
+    Achievement, UserAchievement,
+    MentorAvailability, MentorBooking, Event, EventRegistration
+)
+
+SAMPLE_ID = '00000000-0000-0000-0000-000000000000'
+
+# (ruta, descripción de la consulta, fábrica del SELECT)
+QUERY_PLAN_CHECKS = [
+    ('learning.get_courses', 'cursos por route_type',
+     lambda: select(LearningCourse).where(LearningCourse.route_type == 'pre').order_by(LearningCourse.order_number)),
+    ('learning.get_course_sections', 'secciones por course_id',
+     lambda: select(LearningSection).where(LearningSection.course_id == SAMPLE_ID).order_by(LearningSection.order_number)),
+    ('learning.get_user_progress', 'progreso de cursos por user_id',
+     lambda: select(UserCourseProgress).where(UserCourseProgress.user_id == SAMPLE_ID)),
+    ('learning.get_user_progress', 'progreso de secciones por user_id',
+     lambda: select(UserSectionProgress).where(UserSectionProgress.user_id == SAMPLE_ID)),
+    ('finance.get_transactions', 'transacciones por user_id ordenadas por fecha',
+     lambda: select(Transaction).where(Transaction.user_id == SAMPLE_ID).order_by(Transaction.date.desc())),
+    ('finance.get_summary', 'totales por tipo y categoría',
+     lambda: select(Transaction.type, Transaction.category, func.sum(Transaction.amount))
+        .where(Transaction.user_id == SAMPLE_ID)
+        .group_by(Transaction.type, Transaction.category)),
+    ('community.get_posts', 'posts por categoría ordenados por fecha',
+     lambda: select(CommunityPost).where(CommunityPost.category == 'experiencia').order_by(desc(CommunityPost.created_at))),
+    ('community.get_posts', 'posts por categoría ordenados por hot_score (trending)',
+     lambda: select(CommunityPost).where(CommunityPost.category == 'experiencia').order_by(desc(CommunityPost.hot_score), desc(CommunityPost.id))),
+    ('community.get_post_comments', 'comentarios por post_id',
+     lambda: select(CommunityComment).where(CommunityComment.post_id == SAMPLE_ID).order_by(CommunityComment.created_at)),
+    ('community.toggle_like', 'like por post_id y user_id',
+     lambda: select(CommunityLike).where(CommunityLike.post_id == SAMPLE_ID, CommunityLike.user_id == SAMPLE_ID)),
+    ('achievements.check_and_unlock_achievements', 'logros por requirement_type',
+     lambda: select(Achievement).where(Achievement.requirement_type == 'first_post')),
+    ('achievements.get_user_achievements', 'logros de un usuario',
+     lambda: select(UserAchievement).where(UserAchievement.user_id == SAMPLE_ID)),
+    ('calendar.get_mentor_availability', 'franjas de un mentor por inicio',
+     lambda: select(MentorAvailability).where(
+        MentorAvailability.mentor_id == SAMPLE_ID,
+        MentorAvailability.starts_at >= datetime(2026, 1, 1),
+        MentorAvailability.starts_at < datetime(2026, 2, 1)).order_by(MentorAvailability.starts_at)),
+    ('calendar.get_user_bookings', 'reservas por user_id',
+     lambda: select(MentorBooking).where(MentorBooking.user_id == SAMPLE_ID).order_by(MentorBooking.created_at.desc())),
+    ('calendar.create_booking', 'reserva confirmada por disponibilidad y usuario',
+     lambda: select(MentorBooking).where(
+        MentorBooking.availability_id == SAMPLE_ID, MentorBooking.user_id == SAMPLE_ID,
+        MentorBooking.status == 'confirmed')),
+    ('calendar.get_events', 'eventos ordenados por fecha de inicio',
+     lambda: select(Event).order_by(Event.start_date)),
+    ('calendar.get_user_event_registrations', 'registros por user_id',
+     lambda: select(EventRegistration).where(EventRegistration.user_id == SAMPLE_ID).order_by(EventRegistration.created_at.desc())),
+]
+
+INDEX_MARKERS = {
+    'postgresql': ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan'),
+    'sqlite': ('USING INDEX', 'USING COVERING INDEX', 'USING PRIMARY KEY'),
+}
+
+
+def explain(connection, statement):
+    """Devolver las líneas del plan de consulta para un SELECT"""
+    dialect = connection.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    
+    if dialect.name == 'postgresql':
+        rows = connection.exec_driver_sql(f'EXPLAIN {sql}').fetchall()
+        return [row[0] for row in rows]
+    
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+    return [row[-1] for row in rows]
+
+
+def check_query_plans():
+    """
+    Ejecutar EXPLAIN para cada consulta registrada.
+    Retorna una lista de dicts con route, query, uses_index y plan.
+    """
+    results = []
+    
+    with db.engine.connect() as connection:
+        markers = INDEX_MARKERS.get(connection.dialect.name, INDEX_MARKERS['postgresql'])
+        
+        # En tablas pequeñas Postgres prefiere un seq scan aunque exista el
+        # índice; se desactiva para comprobar que el índice es utilizable.
+        if connection.dialect.name == 'postgresql':
+            connection.exec_driver_sql('SET enable_seqscan = off')
+        
+        for route, description, build in QUERY_PLAN_CHECKS:
+            plan = explain(connection, build())
+            results.append({
+                'route': route,
+                'query': description,
+                'uses_index': any(marker in line for line in plan for marker in markers),
+                'plan': plan
+            })
+        
+        if connection.dialect.name == 'postgresql':
+            connection.exec_driver_sql('RESET enable_seqscan')
+    
+    return results
+
+
+def register_commands(app):
+    """Registrar los comandos de CLI de verificación de índices"""
+    
+    @app.cli.command('check-indexes')
+    @click.option('--verbose', is_flag=True, help='Mostrar el plan completo de cada consulta')
+    def check_indexes_command(verbose):
+        """Verificar que las consultas de cada ruta usan un índice"""
+        results = check_query_plans()
+        missing = [r for r in results if not r['uses_index']]
+        
+        for result in results:
+            status = '✅' if result['uses_index'] else '❌'
+            click.echo(f"{status} {result['route']}: {result['query']}")
+            if verbose or not result['uses_index']:
+                for line in result['plan']:
+                    click.echo(f"      {line}")
+        
+        if missing:
+            click.echo(f"\n⚠️  {len(missing)} consultas sin índice")
+            raise SystemExit(1)
+        
+        click.echo(f"\n✅ Todas las consultas usan índices ({len(results)})")
@@ -1,98 +1,40 @@
 from flask import Blueprint, jsonify, request
 from app.db import db
-from app.models import Achievement, UserAchievement, UserCourseProgress, UserSectionProgress, Transaction
-from sqlalchemy import and_
-import uuid
-from datetime import datetime
+from app.models import Achievement, UserAchievement
+from app.cache import cache
+from app.achievement_engine import evaluate_events, rule_index, get_user_stats
+from app.leaderboard import leaderboard_index, BOARD_GLOBAL, route_board, category_board
+from sqlalchemy import and_, event
 import pytz
 
 achievements_bp = Blueprint('achievements', __name__, url_prefix='/api/achievements')
 bolivia_tz = pytz.timezone('America/La_Paz')
 
-def check_and_unlock_achievements(user_id, achievement_type, achievement_value=None):
-    """Verificar y desbloquear logros según el tipo"""
+ACHIEVEMENT_CATALOG_KEY = 'achievements:catalog'
+
+def load_achievement_catalog():
+    """Catálogo de logros (lista de dicts) leído a través de la caché"""
+    return cache.get_or_set(
+        ACHIEVEMENT_CATALOG_KEY,
+        lambda: [achievement.to_dict() for achievement in Achievement.query.all()]
+    )
+
+def invalidate_achievement_catalog(*args):
+    """Invalidar el catálogo en caché y el índice de reglas (se llama al escribir logros)"""
+    cache.delete(ACHIEVEMENT_CATALOG_KEY)
+    rule_index.invalidate()
+
+for event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Achievement, event_name, invalidate_achievement_catalog)
+
+def unlock_for_events(user_id, events):
+    """
+    Evaluar eventos de dominio (lista de (tipo, valor)) con el motor de logros
+    y guardar los desbloqueos en un solo commit
+    """
     try:
-        # Buscar logros que coincidan con el tipo
-        query = Achievement.query.filter_by(requirement_type=achievement_type)
-        if achievement_value:
-            query = query.filter_by(requirement_value=achievement_value)
-        
-        achievements = query.all()
-        unlocked = []
-        
-        for achievement in achievements:
-            # Verificar si el usuario ya tiene este logro
-            existing = UserAchievement.query.filter_by(
-                user_id=user_id,
-                achievement_id=achievement.id
-            ).first()
-            
-            if existing and existing.progress >= 100:
-                continue  # Ya está desbloqueado
-            
-            # Verificar si cumple el requisito
-            should_unlock = False
-            progress = 0
-            
-            if achievement_type == 'course_completed':
-                # Verificar si el curso está completado
-                course_progress = UserCourseProgress.query.filter_by(
-                    user_id=user_id,
-                    course_id=achievement_value
-                ).first()
-                if course_progress and course_progress.progress_percentage >= 100:
-                    should_unlock = True
-                    progress = 100
-            
-            elif achievement_type == 'first_course_completed':
-                # Verificar si completó al menos un curso
-                completed = UserCourseProgress.query.filter(
-                    and_(
-                        UserCourseProgress.user_id == user_id,
-                        UserCourseProgress.progress_percentage >= 100
-                    )
-                ).count()
-                if completed >= 1:
-                    should_unlock = True
-                    progress = 100
-            
-            elif achievement_type == 'first_sale':
-                # Verificar si tiene al menos una venta
-                sales = Transaction.query.filter(
-                    and_(
-                        Transaction.user_id == user_id,
-                        Transaction.type == 'ingreso'
-                    )
-                ).count()
-                if sales >= 1:
-                    should_unlock = True
-                    progress = 100
-            
-            elif achievement_type == 'first_post':
-                # Verificar si tiene al menos un post
-                from app.models import CommunityPost
-                posts = CommunityPost.query.filter_by(user_id=user_id).count()
-                if posts >= 1:
-                    should_unlock = True
-                    progress = 100
-            
-            if should_unlock:
-                if existing:
-                    existing.progress = 100
-                    existing.unlocked_at = datetime.now(bolivia_tz)
-                else:
-                    user_achievement = UserAchievement(
-                        id=str(uuid.uuid4()),
-                        user_id=user_id,
-                        achievement_id=achievement.id,
-                        progress=100,
-                        unlocked_at=datetime.now(bolivia_tz)
-                    )
-                    db.session.add(user_achievement)
-                    unlocked.append(achievement.to_dict())
-                
-                db.session.commit()
-        
+        unlocked = evaluate_events(user_id, events)
+        db.session.commit()
         return unlocked
     
     except Exception as e:
@@ -100,23 +42,27 @@ def check_and_unlock_achievements(user_id, achievement_type, achievement_value=N
         print(f"Error checking achievements: {str(e)}")
         return []
 
+def check_and_unlock_achievements(user_id, achievement_type, achievement_value=None):
+    """Verificar y desbloquear logros según el tipo"""
+    return unlock_for_events(user_id, [(achievement_type, achievement_value)])
+
 @achievements_bp.route('/user/<user_id>', methods=['GET'])
 def get_user_achievements(user_id):
     """Obtener logros de un usuario"""
     try:
-        user_achievements = UserAchievement.query.filter_by(user_id=user_id).all()
-        achievements_data = [ua.to_dict() for ua in user_achievements]
+        # Catálogo completo con el estado del usuario en una sola consulta:
+        # Achievement LEFT OUTER JOIN UserAchievement
+        rows = db.session.query(Achievement, UserAchievement).outerjoin(
+            UserAchievement,
+            and_(
+                UserAchievement.achievement_id == Achievement.id,
+                UserAchievement.user_id == user_id
+            )
+        ).all()
         
-        # Obtener todos los logros disponibles para mostrar progreso
-        all_achievements = Achievement.query.all()
         all_achievements_dict = {}
         
-        for ach in all_achievements:
-            user_ach = UserAchievement.query.filter_by(
-                user_id=user_id,
-                achievement_id=ach.id
-            ).first()
-            
+        for ach, user_ach in rows:
             all_achievements_dict[ach.id] = {
                 **ach.to_dict(),
                 'unlocked': user_ach is not None and user_ach.progress >= 100,
@@ -156,34 +102,15 @@ def check_achievements(user_id):
 def get_achievement_stats(user_id):
     """Obtener estadísticas de logros de un usuario"""
     try:
-        total_achievements = Achievement.query.count()
-        unlocked_achievements = UserAchievement.query.filter(
-            and_(
-                UserAchievement.user_id == user_id,
-                UserAchievement.progress >= 100
-            )
-        ).count()
-        
-        # Calcular puntos totales
-        unlocked_ua = UserAchievement.query.filter(
-            and_(
-                UserAchievement.user_id == user_id,
-                UserAchievement.progress >= 100
-            )
-        ).all()
-        
-        total_points = sum(ua.achievement.points for ua in unlocked_ua if ua.achievement)
+        total_achievements = len(load_achievement_catalog())
         
-        # Logros por categoría
-        achievements_by_category = {}
-        user_achievements = UserAchievement.query.filter_by(user_id=user_id).all()
+        # Estadísticas materializadas (lectura por clave primaria)
+        stats = get_user_stats(user_id).to_dict()
+        db.session.commit()
         
-        for ua in user_achievements:
-            if ua.progress >= 100 and ua.achievement:
-                category = ua.achievement.category or 'otros'
-                if category not in achievements_by_category:
-                    achievements_by_category[category] = 0
-                achievements_by_category[category] += 1
+        unlocked_achievements = stats['unlocked_count']
+        total_points = stats['total_points']
+        achievements_by_category = stats['by_category']
         
         return jsonify({
             'success': True,
@@ -199,6 +126,43 @@ def get_achievement_stats(user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@achievements_bp.route('/leaderboard', methods=['GET'])
+def get_leaderboard():
+    """
+    Tabla de posiciones por puntos de logros
+    Query params: scope (global, route o category), value (ruta o categoría),
+    limit, user_id (opcional, para incluir la posición del usuario)
+    """
+    scope = request.args.get('scope', 'global')
+    value = request.args.get('value')
+    limit = max(1, min(request.args.get('limit', type=int, default=10), 100))
+    user_id = request.args.get('user_id')
+    
+    if scope == 'global':
+        board = BOARD_GLOBAL
+    elif scope == 'route':
+        if value not in ['pre', 'inc']:
+            return jsonify({'error': 'value debe ser "pre" o "inc" para scope=route'}), 400
+        board = route_board(value)
+    elif scope == 'category':
+        if not value:
+            return jsonify({'error': 'value es requerido para scope=category'}), 400
+        board = category_board(value)
+    else:
+        return jsonify({'error': 'scope debe ser "global", "route" o "category"'}), 400
+    
+    try:
+        return jsonify({
+            'success': True,
+            'board': board,
+            'data': leaderboard_index.top(board, limit),
+            'total_users': leaderboard_index.size(board),
+            'me': leaderboard_index.rank(board, user_id) if user_id else None
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @achievements_bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -1,12 +1,20 @@
 from flask import Blueprint, jsonify, request
 from app.db import db
 from app.models import (
-    MentorAvailability, MentorBooking, Event, EventRegistration
+    AvailabilityTemplate, MentorAvailability, MentorBooking, Event, EventRegistration
 )
-from sqlalchemy import and_, or_, func
+from app.pagination import paginate, get_page_args, InvalidCursor
+from app.availability import (
+    availability_query, local_datetime, expand_templates, template_window, slot_sort_key,
+    find_virtual_slot, parse_virtual_slot_id, parse_weekdays, SlotOverlapError, MAX_INTERVAL_WEEKS
+)
+from app.booking import (
+    book_session, cancel_session_booking, register_for_event, cancel_event_registration, BookingError
+)
+from sqlalchemy import or_, func
+from sqlalchemy.orm import joinedload
 from datetime import datetime, date, time, timedelta
 import pytz
-import uuid
 
 calendar_bp = Blueprint('calendar', __name__, url_prefix='/api/calendar')
 bolivia_tz = pytz.timezone('America/La_Paz')
@@ -24,23 +32,28 @@ def get_mentor_availability():
         end_date = request.args.get('end_date')
         session_type = request.args.get('session_type')  # 'individual', 'grupo', o None para ambos
         
-        query = MentorAvailability.query.filter_by(is_available=True)
-        
-        if mentor_id:
-            query = query.filter_by(mentor_id=mentor_id)
-        
+        # Días completos [start_date 00:00, end_date + 1 00:00) en hora de Bolivia
+        start = None
+        end = None
         if start_date:
-            start = datetime.strptime(start_date, '%Y-%m-%d').date()
-            query = query.filter(MentorAvailability.date >= start)
-        
+            start = local_datetime(datetime.strptime(start_date, '%Y-%m-%d'))
         if end_date:
-            end = datetime.strptime(end_date, '%Y-%m-%d').date()
-            query = query.filter(MentorAvailability.date <= end)
-        
-        if session_type:
-            query = query.filter_by(session_type=session_type)
-        
-        availability = query.order_by(MentorAvailability.date, MentorAvailability.start_time).all()
+            end = local_datetime(datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1))
+        
+        query = availability_query(mentor_id=mentor_id, session_type=session_type)
+        if start is not None:
+            query = query.filter(MentorAvailability.starts_at >= start)
+        if end is not None:
+            query = query.filter(MentorAvailability.starts_at < end)
+        availability = query.all()
+        
+        # Instancias de plantillas recurrentes, solo para la ventana pedida
+        window_start, window_end = template_window(start, end)
+        availability.extend(
+            slot for slot in expand_templates(window_start, window_end, mentor_id, session_type)
+            if slot.starts_at >= window_start
+        )
+        availability.sort(key=slot_sort_key)
         
         return jsonify({
             'success': True,
@@ -50,11 +63,58 @@ def get_mentor_availability():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@calendar_bp.route('/availability/free', methods=['GET'])
+def get_free_slots():
+    """
+    Franjas con cupo libre que se solapan con [start, end)
+    Query params: start, end (ISO 8601, sin zona = hora de Bolivia),
+    mentor_id (opcional), session_type (opcional)
+    """
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        
+        if not start or not end:
+            return jsonify({'error': 'start y end son requeridos'}), 400
+        
+        try:
+            start = local_datetime(datetime.fromisoformat(start.replace('Z', '+00:00')))
+            end = local_datetime(datetime.fromisoformat(end.replace('Z', '+00:00')))
+        except ValueError:
+            return jsonify({'error': 'start y end deben tener formato ISO 8601'}), 400
+        
+        if end <= start:
+            return jsonify({'error': 'end debe ser posterior a start'}), 400
+        
+        slots = availability_query(
+            start, end,
+            mentor_id=request.args.get('mentor_id'),
+            session_type=request.args.get('session_type'),
+            free_only=True
+        ).all()
+        slots.extend(expand_templates(
+            *template_window(start, end),
+            mentor_id=request.args.get('mentor_id'),
+            session_type=request.args.get('session_type')
+        ))
+        slots.sort(key=slot_sort_key)
+        
+        return jsonify({
+            'success': True,
+            'data': [slot.to_dict() for slot in slots]
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @calendar_bp.route('/availability/<availability_id>', methods=['GET'])
 def get_availability_detail(availability_id):
     """Obtener detalle de una disponibilidad específica"""
     try:
-        availability = MentorAvailability.query.get(availability_id)
+        if parse_virtual_slot_id(availability_id) is not None:
+            availability = find_virtual_slot(availability_id)
+        else:
+            availability = MentorAvailability.query.get(availability_id)
         if not availability:
             return jsonify({'error': 'Disponibilidad no encontrada'}), 404
         
@@ -66,6 +126,113 @@ def get_availability_detail(availability_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@calendar_bp.route('/availability/templates', methods=['GET'])
+def get_availability_templates():
+    """Obtener las plantillas de disponibilidad recurrente de un mentor"""
+    try:
+        mentor_id = request.args.get('mentor_id')
+        if not mentor_id:
+            return jsonify({'error': 'mentor_id es requerido'}), 400
+        
+        templates = AvailabilityTemplate.query.filter_by(
+            mentor_id=mentor_id, is_active=True
+        ).order_by(AvailabilityTemplate.starts_on, AvailabilityTemplate.start_time).all()
+        
+        return jsonify({
+            'success': True,
+            'data': [t.to_dict() for t in templates]
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@calendar_bp.route('/availability/templates', methods=['POST'])
+def create_availability_template():
+    """
+    Crear una disponibilidad semanal recurrente
+    Body: mentor_id, weekdays (['MO', 'WE'] o 'MO,WE'), start_time, end_time (HH:MM),
+    session_type, max_participants, starts_on, until (YYYY-MM-DD, opcional), interval_weeks
+    """
+    try:
+        data = request.get_json() or {}
+        
+        required = ['mentor_id', 'weekdays', 'start_time', 'end_time', 'session_type']
+        missing = [field for field in required if not data.get(field)]
+        if missing:
+            return jsonify({'error': f'Campos requeridos: {", ".join(missing)}'}), 400
+        
+        if data['session_type'] not in ('individual', 'grupo'):
+            return jsonify({'error': "session_type debe ser 'individual' o 'grupo'"}), 400
+        
+        try:
+            weekdays = parse_weekdays(data['weekdays'])
+            start_time = datetime.strptime(data['start_time'], '%H:%M').time()
+            end_time = datetime.strptime(data['end_time'], '%H:%M').time()
+            starts_on = (
+                datetime.strptime(data['starts_on'], '%Y-%m-%d').date()
+                if data.get('starts_on') else datetime.now(bolivia_tz).date()
+            )
+            until = datetime.strptime(data['until'], '%Y-%m-%d').date() if data.get('until') else None
+            interval_weeks = int(data.get('interval_weeks') or 1)
+            max_participants = int(data.get('max_participants') or 1)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Datos inválidos: {str(e)}'}), 400
+        
+        if start_time == end_time:
+            return jsonify({'error': 'end_time debe ser distinto de start_time'}), 400
+        if until and until < starts_on:
+            return jsonify({'error': 'until debe ser posterior a starts_on'}), 400
+        if not 1 <= interval_weeks <= MAX_INTERVAL_WEEKS:
+            return jsonify({'error': f'interval_weeks debe estar entre 1 y {MAX_INTERVAL_WEEKS}'}), 400
+        if max_participants < 1:
+            return jsonify({'error': 'max_participants debe ser mayor a 0'}), 400
+        
+        template = AvailabilityTemplate(
+            mentor_id=data['mentor_id'],
+            weekdays=weekdays,
+            interval_weeks=interval_weeks,
+            starts_on=starts_on,
+            until=until,
+            start_time=start_time,
+            end_time=end_time,
+            session_type=data['session_type'],
+            max_participants=max_participants if data['session_type'] == 'grupo' else 1
+        )
+        db.session.add(template)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'data': template.to_dict()
+        }), 201
+    
+    except SlotOverlapError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@calendar_bp.route('/availability/templates/<template_id>', methods=['DELETE'])
+def deactivate_availability_template(template_id):
+    """Desactivar una plantilla; las instancias ya materializadas (y sus reservas) se conservan"""
+    try:
+        template = AvailabilityTemplate.query.get(template_id)
+        if not template:
+            return jsonify({'error': 'Plantilla no encontrada'}), 404
+        
+        template.is_active = False
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Plantilla desactivada'
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @calendar_bp.route('/bookings', methods=['POST'])
 def create_booking():
     """Crear una reserva de mentoría"""
@@ -78,45 +245,8 @@ def create_booking():
         if not availability_id or not user_id:
             return jsonify({'error': 'availability_id y user_id son requeridos'}), 400
         
-        # Verificar que la disponibilidad existe y está disponible
-        availability = MentorAvailability.query.get(availability_id)
-        if not availability:
-            return jsonify({'error': 'Disponibilidad no encontrada'}), 404
-        
-        if not availability.is_available:
-            return jsonify({'error': 'Esta disponibilidad ya no está disponible'}), 400
-        
-        # Verificar si ya existe una reserva para este usuario en esta disponibilidad
-        existing = MentorBooking.query.filter_by(
-            availability_id=availability_id,
-            user_id=user_id,
-            status='confirmed'
-        ).first()
-        
-        if existing:
-            return jsonify({'error': 'Ya tienes una reserva para esta sesión'}), 400
-        
-        # Verificar capacidad para sesiones grupales
-        if availability.session_type == 'grupo':
-            confirmed_bookings = MentorBooking.query.filter(
-                and_(
-                    MentorBooking.availability_id == availability_id,
-                    MentorBooking.status == 'confirmed'
-                )
-            ).count()
-            
-            if confirmed_bookings >= availability.max_participants:
-                return jsonify({'error': 'Esta sesión grupal está llena'}), 400
-        
-        # Crear la reserva
-        booking = MentorBooking(
-            id=str(uuid.uuid4()),
-            availability_id=availability_id,
-            user_id=user_id,
-            status='confirmed',
-            notes=notes
-        )
-        db.session.add(booking)
+        # Reserva atómica del cupo (ver app.booking)
+        booking = book_session(availability_id, user_id, notes)
         db.session.commit()
         
         return jsonify({
@@ -124,23 +254,35 @@ def create_booking():
             'data': booking.to_dict()
         }), 201
     
+    except BookingError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @calendar_bp.route('/bookings/user/<user_id>', methods=['GET'])
 def get_user_bookings(user_id):
-    """Obtener reservas de un usuario"""
+    """
+    Obtener reservas de un usuario
+    Query params: cursor, limit
+    """
     try:
-        bookings = MentorBooking.query.filter_by(user_id=user_id).order_by(
-            MentorBooking.created_at.desc()
-        ).all()
+        cursor, limit = get_page_args()
+        bookings, next_cursor = paginate(
+            MentorBooking.query.options(joinedload(MentorBooking.availability)).filter_by(user_id=user_id),
+            MentorBooking.created_at, MentorBooking.id,
+            cursor=cursor, limit=limit, descending=True
+        )
         
         return jsonify({
             'success': True,
-            'data': [b.to_dict() for b in bookings]
+            'data': [b.to_dict() for b in bookings],
+            'next_cursor': next_cursor
         }), 200
     
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -148,11 +290,7 @@ def get_user_bookings(user_id):
 def cancel_booking(booking_id):
     """Cancelar una reserva"""
     try:
-        booking = MentorBooking.query.get(booking_id)
-        if not booking:
-            return jsonify({'error': 'Reserva no encontrada'}), 404
-        
-        booking.status = 'cancelled'
+        cancel_session_booking(booking_id)
         db.session.commit()
         
         return jsonify({
@@ -160,6 +298,9 @@ def cancel_booking(booking_id):
             'message': 'Reserva cancelada exitosamente'
         }), 200
     
+    except BookingError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -170,7 +311,10 @@ def cancel_booking(booking_id):
 
 @calendar_bp.route('/events', methods=['GET'])
 def get_events():
-    """Obtener eventos"""
+    """
+    Obtener eventos
+    Query params: start_date, end_date, event_type, cursor, limit
+    """
     try:
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
@@ -189,13 +333,20 @@ def get_events():
         if event_type:
             query = query.filter_by(event_type=event_type)
         
-        events = query.order_by(Event.start_date).all()
+        cursor, limit = get_page_args()
+        events, next_cursor = paginate(
+            query, Event.start_date, Event.id,
+            cursor=cursor, limit=limit
+        )
         
         return jsonify({
             'success': True,
-            'data': [e.to_dict() for e in events]
+            'data': [e.to_dict() for e in events],
+            'next_cursor': next_cursor
         }), 200
     
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -225,84 +376,71 @@ def register_to_event(event_id):
         if not user_id:
             return jsonify({'error': 'user_id es requerido'}), 400
         
-        event = Event.query.get(event_id)
-        if not event:
-            return jsonify({'error': 'Evento no encontrado'}), 404
-        
-        # Verificar si ya está registrado
-        existing = EventRegistration.query.filter_by(
-            event_id=event_id,
-            user_id=user_id
-        ).first()
-        
-        if existing:
-            if existing.status == 'confirmed':
-                return jsonify({'error': 'Ya estás registrado en este evento'}), 400
-            else:
-                existing.status = 'confirmed'
-                db.session.commit()
-                return jsonify({
-                    'success': True,
-                    'data': existing.to_dict()
-                }), 200
-        
-        # Verificar capacidad
-        if event.max_participants:
-            confirmed_registrations = EventRegistration.query.filter(
-                and_(
-                    EventRegistration.event_id == event_id,
-                    EventRegistration.status == 'confirmed'
-                )
-            ).count()
-            
-            if confirmed_registrations >= event.max_participants:
-                # Agregar a lista de espera
-                registration = EventRegistration(
-                    id=str(uuid.uuid4()),
-                    event_id=event_id,
-                    user_id=user_id,
-                    status='waitlist'
-                )
-                db.session.add(registration)
-                db.session.commit()
-                return jsonify({
-                    'success': True,
-                    'data': registration.to_dict(),
-                    'message': 'Evento lleno, agregado a lista de espera'
-                }), 200
-        
-        # Crear registro
-        registration = EventRegistration(
-            id=str(uuid.uuid4()),
-            event_id=event_id,
-            user_id=user_id,
-            status='confirmed'
-        )
-        db.session.add(registration)
+        # Registro atómico: confirmado si hay cupo, si no lista de espera (ver app.booking)
+        registration = register_for_event(event_id, user_id)
         db.session.commit()
         
+        if registration.status == 'waitlist':
+            return jsonify({
+                'success': True,
+                'data': registration.to_dict(),
+                'message': 'Evento lleno, agregado a lista de espera'
+            }), 200
+        
         return jsonify({
             'success': True,
             'data': registration.to_dict()
         }), 201
     
+    except BookingError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@calendar_bp.route('/events/registrations/<registration_id>', methods=['DELETE'])
+def cancel_event_registration_route(registration_id):
+    """Cancelar un registro a un evento; el cupo pasa al primero de la lista de espera"""
+    try:
+        promoted = cancel_event_registration(registration_id)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'promoted': promoted.to_dict() if promoted else None,
+            'message': 'Registro cancelado exitosamente'
+        }), 200
+    
+    except BookingError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @calendar_bp.route('/events/user/<user_id>/registrations', methods=['GET'])
 def get_user_event_registrations(user_id):
-    """Obtener registros de eventos de un usuario"""
+    """
+    Obtener registros de eventos de un usuario
+    Query params: cursor, limit
+    """
     try:
-        registrations = EventRegistration.query.filter_by(user_id=user_id).order_by(
-            EventRegistration.created_at.desc()
-        ).all()
+        cursor, limit = get_page_args()
+        registrations, next_cursor = paginate(
+            EventRegistration.query.options(joinedload(EventRegistration.event)).filter_by(user_id=user_id),
+            EventRegistration.created_at, EventRegistration.id,
+            cursor=cursor, limit=limit, descending=True
+        )
         
         return jsonify({
             'success': True,
-            'data': [r.to_dict() for r in registrations]
+            'data': [r.to_dict() for r in registrations],
+            'next_cursor': next_cursor
         }), 200
     
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,33 +1,69 @@
-from flask import Blueprint, jsonify, request
-from app.db import db
+from flask import Blueprint, jsonify, request, Response, current_app
+from app.db import db, upsert_insert
 from app.models import CommunityPost, CommunityComment, CommunityLike
-from sqlalchemy import desc
+from sqlalchemy import update, delete, exists, func
+from datetime import datetime
+import pytz
+from app.pagination import paginate, get_page_args, InvalidCursor
+from app.achievement_engine import record_event
+from app.like_counter import like_counter
+from app.feed import get_feed_page, refresh_feed, compute_hot_score, feed_item, make_excerpt, SORTS, SORT_RECENT
+from app.live import (
+    publish_activity, open_activity_stream, stream_activity, activity_bus,
+    category_channel, post_channel, CHANNEL_ALL, BUSY_RETRY_MS
+)
 import uuid
 
 community_bp = Blueprint('community', __name__, url_prefix='/api/community')
+bolivia_tz = pytz.timezone('America/La_Paz')
+
+def liked_post_ids(user_id, post_ids):
+    """IDs (de post_ids) a los que el usuario dio like, en una sola consulta IN"""
+    if not post_ids:
+        return set()
+    return {
+        post_id for (post_id,) in db.session.query(CommunityLike.post_id).filter(
+            CommunityLike.user_id == user_id,
+            CommunityLike.post_id.in_(post_ids)
+        ).all()
+    }
 
 @community_bp.route('/posts', methods=['GET'])
 def get_posts():
-    """Obtener todos los posts con filtros opcionales"""
+    """
+    Obtener posts con filtros opcionales. Cada post trae un extracto del
+    contenido (excerpt); el contenido completo se obtiene con GET /posts/<id>
+    Query params: category, sort (recent o trending), cursor, limit,
+    viewer_id (opcional, agrega user_liked)
+    """
     category = request.args.get('category')
-    limit = request.args.get('limit', type=int, default=50)
-    offset = request.args.get('offset', type=int, default=0)
+    sort = request.args.get('sort', SORT_RECENT)
+    viewer_id = request.args.get('viewer_id')
+    
+    if sort not in SORTS:
+        return jsonify({'error': 'sort debe ser "recent" o "trending"'}), 400
     
     try:
-        query = CommunityPost.query
+        cursor, limit = get_page_args()
+        posts_data, next_cursor = get_feed_page(category, cursor, limit, sort)
         
-        if category:
-            query = query.filter_by(category=category)
+        for post_data in posts_data:
+            post_data['likes_count'] = max(0, (post_data['likes_count'] or 0) + like_counter.pending(post_data['id']))
         
-        posts = query.order_by(desc(CommunityPost.created_at)).limit(limit).offset(offset).all()
-        posts_data = [post.to_dict() for post in posts]
+        if viewer_id:
+            liked_ids = liked_post_ids(viewer_id, [post_data['id'] for post_data in posts_data])
+            for post_data in posts_data:
+                post_data['user_liked'] = post_data['id'] in liked_ids
         
         return jsonify({
             'success': True,
             'data': posts_data,
-            'count': len(posts_data)
+            'count': len(posts_data),
+            'next_cursor': next_cursor
         }), 200
     
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -47,11 +83,16 @@ def create_post():
             user_id=data['user_id'],
             title=data['title'],
             content=data['content'],
-            category=data['category']
+            category=data['category'],
+            hot_score=compute_hot_score(0, 0, 0)
         )
         
         db.session.add(post)
+        record_event(post.user_id, 'post_created', post.id)
+        db.session.flush()
+        publish_activity('post_created', feed_item(post), [category_channel(post.category)])
         db.session.commit()
+        refresh_feed(post.category)
         
         return jsonify({
             'success': True,
@@ -72,7 +113,7 @@ def get_post(post_id):
         if not post:
             return jsonify({'error': 'Post no encontrado'}), 404
         
-        post_dict = post.to_dict()
+        post_dict = post.to_dict(likes_pending=like_counter.pending(post.id))
         
         # Obtener comentarios
         comments = CommunityComment.query.filter_by(post_id=post_id).order_by(CommunityComment.created_at).all()
@@ -96,6 +137,7 @@ def update_post(post_id):
             return jsonify({'error': 'Post no encontrado'}), 404
         
         data = request.get_json()
+        previous_category = post.category
         
         if 'title' in data:
             post.title = data['title']
@@ -104,16 +146,14 @@ def update_post(post_id):
         if 'category' in data:
             post.category = data['category']
         
-        from datetime import datetime
-        import pytz
-        bolivia_tz = pytz.timezone('America/La_Paz')
         post.updated_at = datetime.now(bolivia_tz)
         
         db.session.commit()
+        refresh_feed(previous_category, post.category)
         
         return jsonify({
             'success': True,
-            'data': post.to_dict(),
+            'data': post.to_dict(likes_pending=like_counter.pending(post.id)),
             'message': 'Post actualizado exitosamente'
         }), 200
     
@@ -130,8 +170,10 @@ def delete_post(post_id):
         if not post:
             return jsonify({'error': 'Post no encontrado'}), 404
         
+        category = post.category
         db.session.delete(post)
         db.session.commit()
+        refresh_feed(category)
         
         return jsonify({
             'success': True,
@@ -144,17 +186,28 @@ def delete_post(post_id):
 
 @community_bp.route('/posts/<post_id>/comments', methods=['GET'])
 def get_post_comments(post_id):
-    """Obtener comentarios de un post"""
+    """
+    Obtener comentarios de un post
+    Query params: cursor, limit
+    """
     try:
-        comments = CommunityComment.query.filter_by(post_id=post_id).order_by(CommunityComment.created_at).all()
+        cursor, limit = get_page_args()
+        comments, next_cursor = paginate(
+            CommunityComment.query.filter_by(post_id=post_id),
+            CommunityComment.created_at, CommunityComment.id,
+            cursor=cursor, limit=limit
+        )
         comments_data = [comment.to_dict() for comment in comments]
         
         return jsonify({
             'success': True,
             'data': comments_data,
-            'count': len(comments_data)
+            'count': len(comments_data),
+            'next_cursor': next_cursor
         }), 200
     
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -162,16 +215,24 @@ def get_post_comments(post_id):
 def create_comment(post_id):
     """Crear un comentario en un post"""
     try:
-        post = CommunityPost.query.get(post_id)
-        
-        if not post:
-            return jsonify({'error': 'Post no encontrado'}), 404
-        
         data = request.get_json()
         
         if 'user_id' not in data or 'content' not in data:
             return jsonify({'error': 'user_id y content son requeridos'}), 400
         
+        # Actualizar contador de comentarios en SQL (comments_count + 1)
+        updated = db.session.execute(
+            update(CommunityPost)
+            .where(CommunityPost.id == post_id)
+            .values(comments_count=func.coalesce(CommunityPost.comments_count, 0) + 1)
+            .returning(CommunityPost.category, CommunityPost.comments_count)
+            .execution_options(synchronize_session=False)
+        ).first()
+        
+        if not updated:
+            db.session.rollback()
+            return jsonify({'error': 'Post no encontrado'}), 404
+        
         comment = CommunityComment(
             id=str(uuid.uuid4()),
             post_id=post_id,
@@ -180,10 +241,15 @@ def create_comment(post_id):
         )
         
         db.session.add(comment)
-        
-        # Actualizar contador de comentarios
-        post.comments_count = CommunityComment.query.filter_by(post_id=post_id).count() + 1
-        
+        db.session.flush()
+        
+        comment_data = comment.to_dict()
+        comment_data['content'] = make_excerpt(comment.content, 1000)[0]
+        publish_activity(
+            'comment_created',
+            {'comment': comment_data, 'comments_count': updated.comments_count},
+            [post_channel(post_id), category_channel(updated.category)]
+        )
         db.session.commit()
         
         return jsonify({
@@ -200,11 +266,6 @@ def create_comment(post_id):
 def toggle_like(post_id):
     """Dar o quitar like a un post"""
     try:
-        post = CommunityPost.query.get(post_id)
-        
-        if not post:
-            return jsonify({'error': 'Post no encontrado'}), 404
-        
         data = request.get_json()
         
         if 'user_id' not in data:
@@ -212,31 +273,58 @@ def toggle_like(post_id):
         
         user_id = data['user_id']
         
-        # Verificar si ya existe el like
-        existing_like = CommunityLike.query.filter_by(post_id=post_id, user_id=user_id).first()
+        post_row = db.session.query(
+            CommunityPost.likes_count, CommunityPost.category
+        ).filter_by(id=post_id).first()
+        if not post_row:
+            return jsonify({'error': 'Post no encontrado'}), 404
+        
+        # Quitar like: DELETE ... RETURNING
+        removed = db.session.execute(
+            delete(CommunityLike)
+            .where(CommunityLike.post_id == post_id, CommunityLike.user_id == user_id)
+            .returning(CommunityLike.id)
+            .execution_options(synchronize_session=False)
+        ).first()
         
-        if existing_like:
-            # Quitar like
-            db.session.delete(existing_like)
-            post.likes_count = max(0, post.likes_count - 1)
+        if removed:
+            delta = -1
             liked = False
         else:
-            # Agregar like
-            like = CommunityLike(
-                id=str(uuid.uuid4()),
-                post_id=post_id,
-                user_id=user_id
-            )
-            db.session.add(like)
-            post.likes_count = post.likes_count + 1
+            # Agregar like: INSERT ... ON CONFLICT DO NOTHING
+            inserted = db.session.execute(
+                upsert_insert(CommunityLike).values(
+                    id=str(uuid.uuid4()),
+                    post_id=post_id,
+                    user_id=user_id,
+                    created_at=datetime.now(bolivia_tz)
+                ).on_conflict_do_nothing(
+                    index_elements=['post_id', 'user_id']
+                ).returning(CommunityLike.id)
+            ).first()
+            
+            # Sin fila insertada: otra petición concurrente registró el mismo like
+            delta = 1 if inserted else 0
             liked = True
         
+        stored_count, category = post_row
+        likes_count = max(0, (stored_count or 0) + like_counter.pending(post_id) + delta)
+        
+        if delta:
+            publish_activity(
+                'likes_updated',
+                {'post_id': post_id, 'likes_count': likes_count},
+                [post_channel(post_id), category_channel(category)]
+            )
         db.session.commit()
         
+        # likes_count se actualiza en lote desde el buffer (ver app.like_counter)
+        like_counter.add(post_id, delta)
+        
         return jsonify({
             'success': True,
             'liked': liked,
-            'likes_count': post.likes_count,
+            'likes_count': likes_count,
             'message': 'Like actualizado exitosamente'
         }), 200
     
@@ -250,12 +338,16 @@ def get_post_likes(post_id):
     try:
         user_id = request.args.get('user_id')
         
-        likes = CommunityLike.query.filter_by(post_id=post_id).all()
-        likes_count = len(likes)
+        # Contador guardado en el post más los likes pendientes del buffer
+        stored_count = db.session.query(CommunityPost.likes_count).filter_by(id=post_id).scalar()
+        likes_count = max(0, (stored_count or 0) + like_counter.pending(post_id))
         
         user_liked = False
         if user_id:
-            user_liked = CommunityLike.query.filter_by(post_id=post_id, user_id=user_id).first() is not None
+            user_liked = db.session.query(exists().where(
+                CommunityLike.post_id == post_id,
+                CommunityLike.user_id == user_id
+            )).scalar()
         
         return jsonify({
             'success': True,
@@ -266,6 +358,39 @@ def get_post_likes(post_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@community_bp.route('/stream', methods=['GET'])
+def stream_community_activity():
+    """
+    Stream (Server-Sent Events) con la actividad de la comunidad: post_created,
+    comment_created y likes_updated
+    Query params: category (opcional), post_id (opcional, se puede repetir).
+    Sin filtros se reciben todos los eventos. Con LIVE_MAX_STREAMS streams
+    abiertos en el worker responde 503 con Retry-After
+    """
+    channels = [post_channel(post_id) for post_id in request.args.getlist('post_id')]
+    if request.args.get('category'):
+        channels.append(category_channel(request.args['category']))
+    
+    subscription = open_activity_stream(
+        current_app._get_current_object(),
+        channels or [CHANNEL_ALL],
+        current_app.config.get('LIVE_MAX_STREAMS')
+    )
+    if subscription is None:
+        return Response(f'retry: {BUSY_RETRY_MS}\n\n', status=503, mimetype='text/event-stream', headers={
+            'Retry-After': str(BUSY_RETRY_MS // 1000),
+            'Cache-Control': 'no-cache'
+        })
+    
+    stream = stream_activity(subscription, current_app.config.get('LIVE_STREAM_SECONDS') or 55)
+    response = Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Si el cliente se va antes de la primera lectura el generador no corre su finally
+    response.call_on_close(lambda: activity_bus.unsubscribe(subscription))
+    return response
+
 @community_bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -1,17 +1,30 @@
 from flask import Blueprint, jsonify, request
 from app.db import db
 from app.models import Transaction
+from app.pagination import paginate, get_page_args, InvalidCursor
+from app.achievement_engine import record_event
+from sqlalchemy import func
 from datetime import datetime
 import pytz
 
 finance_bp = Blueprint('finance', __name__, url_prefix='/api/finance')
 bolivia_tz = pytz.timezone('America/La_Paz')
 
+def totals_by_type(query):
+    """Sumar montos por tipo en la base de datos para la consulta filtrada"""
+    rows = query.with_entities(
+        Transaction.type,
+        func.coalesce(func.sum(Transaction.amount), 0)
+    ).group_by(Transaction.type).all()
+    
+    return {t: float(total) for t, total in rows}
+
 @finance_bp.route('/transactions', methods=['GET'])
 def get_transactions():
     """
     Obtener transacciones de un usuario
-    Query params: user_id (requerido), type (opcional: ingreso/egreso), start_date, end_date
+    Query params: user_id (requerido), type (opcional: ingreso/egreso), start_date, end_date,
+    cursor, limit
     """
     user_id = request.args.get('user_id')
     transaction_type = request.args.get('type')
@@ -37,18 +50,24 @@ def get_transactions():
             end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
             query = query.filter(Transaction.date <= end)
         
-        transactions = query.order_by(Transaction.date.desc()).all()
-        transactions_data = [t.to_dict() for t in transactions]
-        
-        # Calcular totales
-        total_ingresos = sum(t.amount for t in transactions if t.type == 'ingreso')
-        total_egresos = sum(t.amount for t in transactions if t.type == 'egreso')
+        # Calcular totales con SUM ... GROUP BY type
+        totals = totals_by_type(query)
+        total_ingresos = totals.get('ingreso', 0)
+        total_egresos = totals.get('egreso', 0)
         balance = total_ingresos - total_egresos
         
+        cursor, limit = get_page_args()
+        transactions, next_cursor = paginate(
+            query, Transaction.date, Transaction.id,
+            cursor=cursor, limit=limit, descending=True
+        )
+        transactions_data = [t.to_dict() for t in transactions]
+        
         return jsonify({
             'success': True,
             'data': transactions_data,
             'count': len(transactions_data),
+            'next_cursor': next_cursor,
             'summary': {
                 'total_ingresos': total_ingresos,
                 'total_egresos': total_egresos,
@@ -56,6 +75,8 @@ def get_transactions():
             }
         }), 200
     
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -96,6 +117,7 @@ def create_transaction():
         )
         
         db.session.add(transaction)
+        record_event(transaction.user_id, 'transaction_created', transaction.type)
         db.session.commit()
         
         return jsonify({
@@ -196,27 +218,37 @@ def delete_transaction(transaction_id):
 def get_summary(user_id):
     """Obtener resumen financiero de un usuario"""
     try:
-        # Obtener todas las transacciones del usuario
-        transactions = Transaction.query.filter_by(user_id=user_id).all()
-        
-        # Calcular totales
-        total_ingresos = sum(t.amount for t in transactions if t.type == 'ingreso')
-        total_egresos = sum(t.amount for t in transactions if t.type == 'egreso')
-        balance = total_ingresos - total_egresos
-        
-        # Agrupar por categoría
+        # Agregar en la base de datos: una fila por (type, category)
+        rows = db.session.query(
+            Transaction.type,
+            Transaction.category,
+            func.sum(Transaction.amount),
+            func.count(Transaction.id)
+        ).filter(
+            Transaction.user_id == user_id
+        ).group_by(
+            Transaction.type,
+            Transaction.category
+        ).all()
+        
+        total_ingresos = 0
+        total_egresos = 0
+        total_transacciones = 0
         ingresos_por_categoria = {}
         egresos_por_categoria = {}
         
-        for t in transactions:
-            if t.type == 'ingreso':
-                if t.category not in ingresos_por_categoria:
-                    ingresos_por_categoria[t.category] = 0
-                ingresos_por_categoria[t.category] += t.amount
+        for t_type, category, amount, count in rows:
+            amount = float(amount or 0)
+            total_transacciones += count
+            if t_type == 'ingreso':
+                total_ingresos += amount
+                ingresos_por_categoria[category] = amount
             else:
-                if t.category not in egresos_por_categoria:
-                    egresos_por_categoria[t.category] = 0
-                egresos_por_categoria[t.category] += t.amount
+                if t_type == 'egreso':
+                    total_egresos += amount
+                egresos_por_categoria[category] = egresos_por_categoria.get(category, 0) + amount
+        
+        balance = total_ingresos - total_egresos
         
         return jsonify({
             'success': True,
@@ -224,7 +256,7 @@ def get_summary(user_id):
                 'total_ingresos': total_ingresos,
                 'total_egresos': total_egresos,
                 'balance': balance,
-                'total_transacciones': len(transactions),
+                'total_transacciones': total_transacciones,
                 'ingresos_por_categoria': ingresos_por_categoria,
                 'egresos_por_categoria': egresos_por_categoria
             }
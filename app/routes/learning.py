@@ -1,9 +1,133 @@
-from flask import Blueprint, jsonify, request
-from app.db import db
+from flask import Blueprint, jsonify, request, current_app
+from app.db import db, upsert_insert
 from app.models import LearningCourse, LearningSection, UserCourseProgress, UserSectionProgress
-from sqlalchemy import and_
+from app.cache import cache, compute_etag
+from app.achievement_engine import record_event
+from sqlalchemy import and_, func, event, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import object_session
+from datetime import datetime
+import pytz
+import uuid
 
 learning_bp = Blueprint('learning', __name__, url_prefix='/api/learning')
+bolivia_tz = pytz.timezone('America/La_Paz')
+
+# Máximo de entradas por lote de sincronización de progreso
+MAX_BATCH_ENTRIES = 500
+
+# Las entradas del catálogo (cursos y secciones) usan el prefijo 'catalog:'
+CATALOG_PREFIX = 'catalog:'
+
+# Clave de session.info: la transacción escribió cursos o secciones
+CATALOG_DIRTY_KEY = 'catalog_dirty'
+
+def mark_catalog_dirty(mapper, connection, target):
+    """Marcar la sesión; el catálogo se invalida después del commit"""
+    session = object_session(target)
+    if session is not None:
+        session.info[CATALOG_DIRTY_KEY] = True
+
+def invalidate_catalog(session):
+    """
+    Invalidar el catálogo en caché tras el commit. Antes del commit una lectura
+    concurrente podría volver a cachear las filas anteriores.
+    """
+    if session.info.pop(CATALOG_DIRTY_KEY, False):
+        cache.delete_prefix(CATALOG_PREFIX)
+
+def discard_catalog_dirty(session):
+    session.info.pop(CATALOG_DIRTY_KEY, None)
+
+for model in (LearningCourse, LearningSection):
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, mark_catalog_dirty)
+event.listen(db.session, 'after_commit', invalidate_catalog)
+event.listen(db.session, 'after_rollback', discard_catalog_dirty)
+
+def cached_catalog_response(key, loader):
+    """
+    Responder con el cuerpo en caché para `key`, cargándolo con loader() si no
+    existe. Devuelve 304 si el cliente envía un If-None-Match vigente.
+    """
+    def load():
+        body = loader()
+        if body is None:
+            return None
+        return {'body': body, 'etag': compute_etag(body)}
+    
+    cached = cache.get_or_set(CATALOG_PREFIX + key, load, ttl=current_app.config.get('CATALOG_CACHE_TTL'))
+    if cached is None:
+        return None
+    
+    response = jsonify(cached['body'])
+    response.set_etag(cached['etag'])
+    # make_conditional responde 304 si If-None-Match coincide con el ETag
+    return response.make_conditional(request)
+
+def load_courses(route_type):
+    """Cursos de una ruta con el total de secciones de cada uno"""
+    # Contar secciones de todos los cursos en una sola consulta agrupada
+    section_counts = db.session.query(
+        LearningSection.course_id,
+        func.count(LearningSection.id).label('total_sections')
+    ).group_by(LearningSection.course_id).subquery()
+    
+    courses = db.session.query(
+        LearningCourse,
+        func.coalesce(section_counts.c.total_sections, 0)
+    ).outerjoin(
+        section_counts, section_counts.c.course_id == LearningCourse.id
+    ).filter(
+        LearningCourse.route_type == route_type
+    ).order_by(LearningCourse.order_number).all()
+    
+    courses_data = []
+    for course, sections_count in courses:
+        course_dict = course.to_dict()
+        course_dict['total_sections'] = sections_count
+        courses_data.append(course_dict)
+    
+    return {
+        'success': True,
+        'data': courses_data,
+        'count': len(courses_data)
+    }
+
+def load_course(course_id):
+    """Curso con sus secciones, o None si no existe"""
+    course = LearningCourse.query.get(course_id)
+    
+    if not course:
+        return None
+    
+    course_dict = course.to_dict()
+    
+    # Obtener secciones
+    sections = LearningSection.query.filter_by(course_id=course_id).order_by(LearningSection.order_number).all()
+    course_dict['sections'] = [section.to_dict() for section in sections]
+    course_dict['total_sections'] = len(sections)
+    
+    return {
+        'success': True,
+        'data': course_dict
+    }
+
+def load_course_sections(course_id):
+    """Secciones de un curso, o None si el curso no existe"""
+    course = LearningCourse.query.get(course_id)
+    
+    if not course:
+        return None
+    
+    sections = LearningSection.query.filter_by(course_id=course_id).order_by(LearningSection.order_number).all()
+    sections_data = [section.to_dict() for section in sections]
+    
+    return {
+        'success': True,
+        'data': sections_data,
+        'count': len(sections_data)
+    }
 
 @learning_bp.route('/courses', methods=['GET'])
 def get_courses():
@@ -17,21 +141,7 @@ def get_courses():
         return jsonify({'error': 'route_type es requerido y debe ser "pre" o "inc"'}), 400
     
     try:
-        courses = LearningCourse.query.filter_by(route_type=route_type).order_by(LearningCourse.order_number).all()
-        
-        courses_data = []
-        for course in courses:
-            course_dict = course.to_dict()
-            # Contar secciones
-            sections_count = LearningSection.query.filter_by(course_id=course.id).count()
-            course_dict['total_sections'] = sections_count
-            courses_data.append(course_dict)
-        
-        return jsonify({
-            'success': True,
-            'data': courses_data,
-            'count': len(courses_data)
-        }), 200
+        return cached_catalog_response(f'courses:{route_type}', lambda: load_courses(route_type))
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -40,22 +150,12 @@ def get_courses():
 def get_course(course_id):
     """Obtener un curso específico con sus secciones"""
     try:
-        course = LearningCourse.query.get(course_id)
+        response = cached_catalog_response(f'course:{course_id}', lambda: load_course(course_id))
         
-        if not course:
+        if response is None:
             return jsonify({'error': 'Curso no encontrado'}), 404
         
-        course_dict = course.to_dict()
-        
-        # Obtener secciones
-        sections = LearningSection.query.filter_by(course_id=course_id).order_by(LearningSection.order_number).all()
-        course_dict['sections'] = [section.to_dict() for section in sections]
-        course_dict['total_sections'] = len(sections)
-        
-        return jsonify({
-            'success': True,
-            'data': course_dict
-        }), 200
+        return response
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -64,19 +164,12 @@ def get_course(course_id):
 def get_course_sections(course_id):
     """Obtener todas las secciones de un curso"""
     try:
-        course = LearningCourse.query.get(course_id)
+        response = cached_catalog_response(f'sections:{course_id}', lambda: load_course_sections(course_id))
         
-        if not course:
+        if response is None:
             return jsonify({'error': 'Curso no encontrado'}), 404
         
-        sections = LearningSection.query.filter_by(course_id=course_id).order_by(LearningSection.order_number).all()
-        sections_data = [section.to_dict() for section in sections]
-        
-        return jsonify({
-            'success': True,
-            'data': sections_data,
-            'count': len(sections_data)
-        }), 200
+        return response
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -150,26 +243,23 @@ def update_section_progress():
         
         user_id = data.get('user_id')
         section_id = data.get('section_id')
-        completed = data.get('completed', False)
+        completed = bool(data.get('completed', False))
         
         if not user_id or not section_id:
             return jsonify({'error': 'user_id y section_id son requeridos'}), 400
         
+        section = LearningSection.query.get(section_id)
+        if not section:
+            return jsonify({'error': 'Sección no encontrada'}), 404
+        
         # Buscar o crear progreso de sección
         progress = UserSectionProgress.query.filter_by(
             user_id=user_id,
             section_id=section_id
         ).first()
         
-        if progress:
-            progress.completed = completed
-            if completed:
-                from datetime import datetime
-                import pytz
-                bolivia_tz = pytz.timezone('America/La_Paz')
-                progress.completed_at = datetime.now(bolivia_tz)
-        else:
-            import uuid
+        flipped = False
+        if progress is None:
             progress = UserSectionProgress(
                 id=str(uuid.uuid4()),
                 user_id=user_id,
@@ -177,18 +267,51 @@ def update_section_progress():
                 completed=completed
             )
             if completed:
-                from datetime import datetime
-                import pytz
-                bolivia_tz = pytz.timezone('America/La_Paz')
                 progress.completed_at = datetime.now(bolivia_tz)
-            db.session.add(progress)
+            try:
+                with db.session.begin_nested():
+                    db.session.add(progress)
+                flipped = completed
+            except IntegrityError:
+                # Otra petición creó el registro primero (unique_user_section)
+                progress = UserSectionProgress.query.filter_by(
+                    user_id=user_id,
+                    section_id=section_id
+                ).first()
         
-        db.session.commit()
+        if not flipped:
+            # Cambio condicional: con peticiones concurrentes solo una cambia la fila
+            # y solo esa actualiza el contador del curso
+            flipped = db.session.execute(
+                update(UserSectionProgress)
+                .where(
+                    UserSectionProgress.id == progress.id,
+                    UserSectionProgress.completed.is_distinct_from(completed)
+                )
+                .values(completed=completed)
+            ).rowcount == 1
+            progress.completed_at = datetime.now(bolivia_tz) if completed else None
         
-        # Actualizar progreso del curso
-        section = LearningSection.query.get(section_id)
-        if section:
-            update_course_progress(user_id, section.course_id)
+        db.session.flush()
+        
+        # Actualizar progreso del curso en la misma transacción
+        course_progress = UserCourseProgress.query.filter_by(
+            user_id=user_id,
+            course_id=section.course_id
+        ).first()
+        
+        if course_progress is None:
+            course_progress, just_completed = recompute_course_progress(user_id, section.course_id)
+        elif flipped:
+            just_completed = increment_course_progress(course_progress, 1 if completed else -1)
+        else:
+            just_completed = False
+        
+        # Los logros se evalúan en segundo plano (outbox)
+        if just_completed:
+            record_event(user_id, 'course_completed', section.course_id)
+        
+        db.session.commit()
         
         return jsonify({
             'success': True,
@@ -199,74 +322,191 @@ def update_section_progress():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-def update_course_progress(user_id, course_id):
-    """Actualizar el progreso general de un curso basado en las secciones completadas"""
+@learning_bp.route('/progress/sections/batch', methods=['POST'])
+def update_section_progress_batch():
+    """
+    Actualizar el progreso de varias secciones (sincronización offline).
+    Body: user_id, entries: [{section_id, completed, completed_at (opcional)}]
+    """
     try:
-        # Obtener todas las secciones del curso
-        sections = LearningSection.query.filter_by(course_id=course_id).all()
-        total_sections = len(sections)
+        data = request.get_json()
         
-        if total_sections == 0:
-            return
+        user_id = data.get('user_id')
+        entries = data.get('entries')
         
-        section_ids = [s.id for s in sections]
+        if not user_id or not isinstance(entries, list):
+            return jsonify({'error': 'user_id y entries son requeridos'}), 400
         
-        # Contar secciones completadas
-        completed_sections = UserSectionProgress.query.filter(
-            and_(
-                UserSectionProgress.user_id == user_id,
-                UserSectionProgress.section_id.in_(section_ids),
-                UserSectionProgress.completed == True
-            )
-        ).count()
+        if len(entries) > MAX_BATCH_ENTRIES:
+            return jsonify({'error': f'entries admite como máximo {MAX_BATCH_ENTRIES} elementos'}), 400
         
-        # Calcular porcentaje
-        progress_percentage = int((completed_sections / total_sections) * 100)
+        # Si una sección aparece varias veces gana la última entrada
+        by_section = {}
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict) or not entry.get('section_id'):
+                return jsonify({'error': f'entries[{index}]: section_id es requerido'}), 400
+            completed_at = entry.get('completed_at')
+            if completed_at:
+                try:
+                    completed_at = datetime.fromisoformat(completed_at.replace('Z', '+00:00'))
+                except (AttributeError, ValueError):
+                    return jsonify({
+                        'error': f'entries[{index}] (section_id {entry["section_id"]}): completed_at debe tener formato ISO 8601'
+                    }), 400
+            by_section[entry['section_id']] = {**entry, 'completed_at': completed_at}
         
-        # Buscar o crear progreso del curso
-        course_progress = UserCourseProgress.query.filter_by(
-            user_id=user_id,
-            course_id=course_id
-        ).first()
+        sections = LearningSection.query.with_entities(
+            LearningSection.id, LearningSection.course_id
+        ).filter(LearningSection.id.in_(list(by_section))).all()
+        course_by_section = dict(sections)
+        skipped = [section_id for section_id in by_section if section_id not in course_by_section]
         
-        if course_progress:
-            course_progress.completed_sections = completed_sections
-            course_progress.total_sections = total_sections
-            course_progress.progress_percentage = progress_percentage
-            
-            if progress_percentage == 100 and not course_progress.completed_at:
-                from datetime import datetime
-                import pytz
-                bolivia_tz = pytz.timezone('America/La_Paz')
-                course_progress.completed_at = datetime.now(bolivia_tz)
-                
-                # Verificar logros al completar un curso
-                from app.routes.achievements import check_and_unlock_achievements
-                check_and_unlock_achievements(user_id, 'course_completed', course_id)
-                check_and_unlock_achievements(user_id, 'first_course_completed')
-        else:
-            import uuid
-            course_progress = UserCourseProgress(
-                id=str(uuid.uuid4()),
-                user_id=user_id,
-                course_id=course_id,
-                completed_sections=completed_sections,
-                total_sections=total_sections,
-                progress_percentage=progress_percentage
+        now = datetime.now(bolivia_tz)
+        rows = []
+        for section_id, entry in by_section.items():
+            if section_id not in course_by_section:
+                continue
+            completed = bool(entry.get('completed', False))
+            completed_at = None
+            if completed:
+                completed_at = now
+                if entry['completed_at']:
+                    completed_at = entry['completed_at']
+            rows.append({
+                'id': str(uuid.uuid4()),
+                'user_id': user_id,
+                'section_id': section_id,
+                'completed': completed,
+                'completed_at': completed_at,
+                'created_at': now
+            })
+        
+        if rows:
+            # INSERT ... ON CONFLICT (user_id, section_id) DO UPDATE
+            stmt = upsert_insert(UserSectionProgress).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['user_id', 'section_id'],
+                set_={
+                    'completed': stmt.excluded.completed,
+                    # Las entradas sin completar traen completed_at NULL: se borra la fecha
+                    'completed_at': stmt.excluded.completed_at
+                }
             )
-            db.session.add(course_progress)
-            
-            # Si se completa al crear, verificar logros
-            if progress_percentage == 100:
-                from app.routes.achievements import check_and_unlock_achievements
-                check_and_unlock_achievements(user_id, 'course_completed', course_id)
-                check_and_unlock_achievements(user_id, 'first_course_completed')
+            db.session.execute(stmt)
+        
+        # Recalcular cada curso afectado una sola vez
+        courses_data = []
+        for course_id in sorted({course_by_section[row['section_id']] for row in rows}):
+            course_progress, just_completed = recompute_course_progress(user_id, course_id)
+            if course_progress is not None:
+                courses_data.append(course_progress)
+            if just_completed:
+                record_event(user_id, 'course_completed', course_id)
         
         db.session.commit()
         
+        return jsonify({
+            'success': True,
+            'data': {
+                'updated': len(rows),
+                'skipped': skipped,
+                'courses': [course_progress.to_dict() for course_progress in courses_data]
+            }
+        }), 200
+    
     except Exception as e:
         db.session.rollback()
-        print(f"Error updating course progress: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def increment_course_progress(course_progress, delta):
+    """
+    Sumar `delta` secciones completadas con un UPDATE atómico
+    (completed_sections = completed_sections + delta). No hace commit.
+    Si el contador saldría de [0, total_sections] (se desvió, p. ej. por
+    secciones borradas), se recalcula contando las secciones.
+    Retorna True si el curso se acaba de completar.
+    """
+    total_sections = LearningSection.query.filter_by(course_id=course_progress.course_id).count()
+    
+    if total_sections == 0:
+        return False
+    
+    completed_sections = func.coalesce(UserCourseProgress.completed_sections, 0) + delta
+    updated = db.session.execute(
+        update(UserCourseProgress)
+        .where(
+            UserCourseProgress.id == course_progress.id,
+            completed_sections.between(0, total_sections)
+        )
+        .values(
+            completed_sections=completed_sections,
+            total_sections=total_sections,
+            progress_percentage=completed_sections * 100 // total_sections
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    
+    if updated != 1:
+        _, just_completed = recompute_course_progress(course_progress.user_id, course_progress.course_id)
+        return just_completed
+    
+    # Recargar los valores calculados por la BD
+    db.session.refresh(course_progress)
+    if course_progress.progress_percentage >= 100 and not course_progress.completed_at:
+        course_progress.completed_at = datetime.now(bolivia_tz)
+        return True
+    
+    return False
+
+def recompute_course_progress(user_id, course_id):
+    """
+    Recalcular el progreso de un curso contando todas las secciones completadas.
+    Se usa cuando aún no existe el registro de progreso. No hace commit.
+    Retorna (course_progress, just_completed).
+    """
+    total_sections = LearningSection.query.filter_by(course_id=course_id).count()
+    
+    if total_sections == 0:
+        return None, False
+    
+    # Contar secciones completadas
+    completed_sections = UserSectionProgress.query.join(
+        LearningSection, LearningSection.id == UserSectionProgress.section_id
+    ).filter(
+        and_(
+            UserSectionProgress.user_id == user_id,
+            LearningSection.course_id == course_id,
+            UserSectionProgress.completed == True
+        )
+    ).count()
+    
+    # Calcular porcentaje
+    progress_percentage = int((completed_sections / total_sections) * 100)
+    
+    # Buscar o crear progreso del curso
+    course_progress = UserCourseProgress.query.filter_by(
+        user_id=user_id,
+        course_id=course_id
+    ).first()
+    
+    if course_progress is None:
+        course_progress = UserCourseProgress(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            course_id=course_id
+        )
+        db.session.add(course_progress)
+    
+    course_progress.completed_sections = completed_sections
+    course_progress.total_sections = total_sections
+    course_progress.progress_percentage = progress_percentage
+    
+    just_completed = False
+    if progress_percentage == 100 and not course_progress.completed_at:
+        course_progress.completed_at = datetime.now(bolivia_tz)
+        just_completed = True
+    
+    return course_progress, just_completed
 
 @learning_bp.route('/health', methods=['GET'])
 def health_check():
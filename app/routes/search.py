@@ -0,0 +1,36 @@
+from flask import Blueprint, jsonify, request
+from app.pagination import get_page_args, InvalidCursor
+from app.search import search, KINDS
+
+search_bp = Blueprint('search', __name__, url_prefix='/api/search')
+
+@search_bp.route('', methods=['GET'])
+def search_content():
+    """
+    Buscar en posts de la comunidad y secciones de cursos, por relevancia
+    Query params: q, type (post o section, opcional), cursor, limit
+    """
+    query_text = (request.args.get('q') or '').strip()
+    kind = request.args.get('type')
+    
+    if not query_text:
+        return jsonify({'error': 'q es requerido'}), 400
+    
+    if kind and kind not in KINDS:
+        return jsonify({'error': 'type debe ser "post" o "section"'}), 400
+    
+    try:
+        cursor, limit = get_page_args()
+        results, next_cursor = search(query_text, (kind,) if kind else KINDS, cursor, limit)
+        
+        return jsonify({
+            'success': True,
+            'data': results,
+            'count': len(results),
+            'next_cursor': next_cursor
+        }), 200
+    
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
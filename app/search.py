@@ -0,0 +1,331 @@
+"""
+Búsqueda de texto completo en posts de la comunidad y secciones de cursos.
+
+En PostgreSQL cada tabla tiene una columna generada `search_vector` (tsvector
+con la configuración 'spanish', pesos A/B/C por campo) con índice GIN, que se
+crea junto con la tabla (db.create_all) o con la migración add_search_vectors. La consulta usa websearch_to_tsquery, ordena por
+ts_rank y pagina por cursor sobre (rank, clave), sin cargar las tablas.
+
+En otros motores (SQLite en pruebas locales) se usa un índice invertido en
+memoria con la misma semántica: todos los términos deben aparecer, con
+normalización de acentos, stopwords y un stemming simple. Los cambios de
+posts y secciones se aplican al índice después del commit de la sesión.
+"""
+import math
+import re
+import threading
+import unicodedata
+
+from sqlalchemy import DDL, event, text
+from sqlalchemy.orm import object_session
+
+from app.db import db
+from app.feed import make_excerpt
+from app.models import CommunityPost, LearningSection
+from app.pagination import encode_cursor, decode_cursor, DEFAULT_LIMIT
+
+SEARCH_CONFIG = 'spanish'
+
+KIND_POST = 'post'
+KIND_SECTION = 'section'
+KINDS = (KIND_POST, KIND_SECTION)
+
+# Caracteres de contenido en cada resultado
+SNIPPET_LENGTH = 200
+
+# Tabla de cada tipo de resultado (columna search_vector en PostgreSQL)
+SEARCH_TABLES = {
+    KIND_POST: 'community_posts',
+    KIND_SECTION: 'learning_sections',
+}
+
+# Columna generada: title pesa A, el resto B/C (igual que la migración add_search_vectors)
+SEARCH_VECTORS = {
+    CommunityPost.__table__: """
+        setweight(to_tsvector('spanish', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(content, '')), 'B')
+    """,
+    LearningSection.__table__: """
+        setweight(to_tsvector('spanish', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('spanish', coalesce(content, '')), 'C')
+    """,
+}
+
+# Pesos de ts_rank por defecto: {D, C, B, A} = {0.1, 0.2, 0.4, 1.0}
+FIELD_WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2}
+
+STOPWORDS = {
+    'a', 'al', 'algo', 'con', 'como', 'cual', 'de', 'del', 'desde', 'donde',
+    'e', 'el', 'ella', 'ellos', 'en', 'entre', 'era', 'es', 'esa', 'ese',
+    'eso', 'esta', 'este', 'esto', 'fue', 'ha', 'hay', 'la', 'las', 'le',
+    'les', 'lo', 'los', 'mas', 'me', 'mi', 'mis', 'muy', 'no', 'nos', 'o',
+    'para', 'pero', 'por', 'que', 'se', 'sin', 'sobre', 'su', 'sus', 'te',
+    'tu', 'un', 'una', 'uno', 'unos', 'unas', 'y', 'ya', 'yo',
+}
+
+
+def search_key(kind, row_id):
+    return f'{kind}:{row_id}'
+
+
+def normalize(value):
+    """Minúsculas y sin acentos"""
+    value = unicodedata.normalize('NFKD', (value or '').lower())
+    return ''.join(char for char in value if not unicodedata.combining(char))
+
+
+def stem(word):
+    """Stemming mínimo para plurales del español"""
+    if len(word) > 4 and word.endswith('es'):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def tokenize(value):
+    return [
+        stem(word) for word in re.findall(r'\w+', normalize(value))
+        if len(word) > 1 and word not in STOPWORDS
+    ]
+
+
+def document_fields(kind, row):
+    """Campos indexados de una fila con su peso"""
+    if kind == KIND_POST:
+        return [(row.title, 'A'), (row.content, 'B')]
+    return [(row.title, 'A'), (row.description, 'B'), (row.content, 'C')]
+
+
+class InvertedIndex:
+    """Índice invertido en memoria: término -> {clave: frecuencia ponderada}"""
+
+    def __init__(self):
+        self._postings = {}
+        self._documents = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _add(self, key, fields):
+        self._remove(key)
+        terms = {}
+        for value, weight in fields:
+            for term in tokenize(value):
+                terms[term] = terms.get(term, 0) + FIELD_WEIGHTS[weight]
+        self._documents[key] = terms
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[key] = frequency
+
+    def _remove(self, key):
+        for term in self._documents.pop(key, {}):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for post in CommunityPost.query.all():
+                self._add(search_key(KIND_POST, post.id), document_fields(KIND_POST, post))
+            for section in LearningSection.query.all():
+                self._add(search_key(KIND_SECTION, section.id), document_fields(KIND_SECTION, section))
+            self._loaded = True
+
+    def update(self, kind, row_id, fields):
+        """Reindexar una fila (solo si el índice ya está cargado)"""
+        if self._loaded:
+            with self._lock:
+                self._add(search_key(kind, row_id), fields)
+
+    def remove(self, kind, row_id):
+        if self._loaded:
+            with self._lock:
+                self._remove(search_key(kind, row_id))
+
+    def search(self, query_text, kinds=KINDS):
+        """Claves que contienen todos los términos, como [(rank, clave)]"""
+        self._ensure_loaded()
+        terms = set(tokenize(query_text))
+        if not terms:
+            return []
+
+        with self._lock:
+            postings = [self._postings.get(term, {}) for term in terms]
+            total = len(self._documents) or 1
+            matches = set.intersection(*(set(keys) for keys in postings)) if postings else set()
+            results = []
+            for key in matches:
+                if key.split(':', 1)[0] not in kinds:
+                    continue
+                rank = sum(
+                    posting[key] * math.log(1 + total / len(posting))
+                    for posting in postings
+                ) / (1 + math.log(1 + sum(self._documents[key].values())))
+                results.append((rank, key))
+        return results
+
+
+inverted_index = InvertedIndex()
+
+
+def postgres_search(query_text, kinds, after, limit):
+    """Página de resultados [(rank, clave)] usando search_vector y el índice GIN"""
+    sources = ' UNION ALL '.join(
+        f"SELECT '{kind}' || ':' || t.id AS key, "
+        f"ts_rank(t.search_vector, q.query)::float8 AS rank "
+        f"FROM {SEARCH_TABLES[kind]} t, q WHERE t.search_vector @@ q.query"
+        for kind in kinds
+    )
+    params = {'config': SEARCH_CONFIG, 'query': query_text, 'limit': limit}
+    where = ''
+    if after:
+        where = 'WHERE (r.rank, r.key) < (:after_rank, :after_key)'
+        params['after_rank'], params['after_key'] = after
+
+    rows = db.session.execute(text(f"""
+        WITH q AS (SELECT websearch_to_tsquery(CAST(:config AS regconfig), :query) AS query)
+        SELECT r.rank, r.key FROM ({sources}) r
+        {where}
+        ORDER BY r.rank DESC, r.key DESC
+        LIMIT :limit
+    """), params).all()
+    return [(rank, key) for rank, key in rows]
+
+
+def fallback_search(query_text, kinds, after, limit):
+    """Misma página que postgres_search usando el índice invertido en memoria"""
+    results = sorted(inverted_index.search(query_text, kinds), reverse=True)
+    if after:
+        results = [result for result in results if result < tuple(after)]
+    return results[:limit]
+
+
+def load_results(page):
+    """Convertir [(rank, clave)] en resultados, con una consulta por tipo"""
+    ids_by_kind = {}
+    for rank, key in page:
+        kind, row_id = key.split(':', 1)
+        ids_by_kind.setdefault(kind, []).append(row_id)
+
+    rows = {}
+    if ids_by_kind.get(KIND_POST):
+        for post in CommunityPost.query.filter(CommunityPost.id.in_(ids_by_kind[KIND_POST])).all():
+            rows[search_key(KIND_POST, post.id)] = {
+                'type': KIND_POST,
+                'id': post.id,
+                'title': post.title,
+                'snippet': make_excerpt(post.content, SNIPPET_LENGTH)[0],
+                'category': post.category,
+                'created_at': post.created_at.isoformat() if post.created_at else None
+            }
+    if ids_by_kind.get(KIND_SECTION):
+        for section in LearningSection.query.filter(LearningSection.id.in_(ids_by_kind[KIND_SECTION])).all():
+            rows[search_key(KIND_SECTION, section.id)] = {
+                'type': KIND_SECTION,
+                'id': section.id,
+                'title': section.title,
+                'snippet': make_excerpt(section.description or section.content, SNIPPET_LENGTH)[0],
+                'course_id': section.course_id,
+                'order_number': section.order_number
+            }
+
+    results = []
+    for rank, key in page:
+        if key in rows:
+            results.append({**rows[key], 'rank': round(rank, 6)})
+    return results
+
+
+def search(query_text, kinds=KINDS, cursor=None, limit=DEFAULT_LIMIT):
+    """
+    Buscar query_text en los tipos indicados, ordenado por relevancia.
+    Retorna (resultados, next_cursor). Lanza InvalidCursor si el cursor no es válido.
+    """
+    after = decode_cursor(cursor) if cursor else None
+
+    if db.engine.dialect.name == 'postgresql':
+        page = postgres_search(query_text, kinds, after, limit + 1)
+    else:
+        page = fallback_search(query_text, kinds, after, limit + 1)
+
+    # Se pide una fila extra para saber si hay más páginas
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(*page[-1])
+
+    return load_results(page), next_cursor
+
+
+# Cambios de la transacción pendientes de commit, en session.info
+PENDING_KEY = 'search_pending_changes'
+
+
+def queue_change(target, change):
+    """Guardar el cambio en la sesión; se aplica al índice tras el commit"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(PENDING_KEY, []).append(change)
+
+
+def reindex_post(mapper, connection, target):
+    # Los campos se copian al hacer flush: tras el commit la fila está expirada
+    queue_change(target, (KIND_POST, target.id, document_fields(KIND_POST, target)))
+
+
+def reindex_section(mapper, connection, target):
+    queue_change(target, (KIND_SECTION, target.id, document_fields(KIND_SECTION, target)))
+
+
+def unindex_post(mapper, connection, target):
+    queue_change(target, (KIND_POST, target.id, None))
+
+
+def unindex_section(mapper, connection, target):
+    queue_change(target, (KIND_SECTION, target.id, None))
+
+
+def apply_pending(session):
+    for kind, row_id, fields in session.info.pop(PENDING_KEY, []):
+        if fields is None:
+            inverted_index.remove(kind, row_id)
+        else:
+            inverted_index.update(kind, row_id, fields)
+
+
+def discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+# El índice en memoria sigue los cambios confirmados de este proceso
+event.listen(CommunityPost, 'after_insert', reindex_post)
+event.listen(CommunityPost, 'after_update', reindex_post)
+event.listen(CommunityPost, 'after_delete', unindex_post)
+event.listen(LearningSection, 'after_insert', reindex_section)
+event.listen(LearningSection, 'after_update', reindex_section)
+event.listen(LearningSection, 'after_delete', unindex_section)
+event.listen(db.session, 'after_commit', apply_pending)
+event.listen(db.session, 'after_rollback', discard_pending)
+
+# Tablas nuevas (db.create_all) en PostgreSQL; en bases existentes lo crea la migración
+for table, expression in SEARCH_VECTORS.items():
+    event.listen(
+        table, 'after_create',
+        DDL(f"""
+            ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS ({expression}) STORED
+        """).execute_if(dialect='postgresql')
+    )
+    event.listen(
+        table, 'after_create',
+        DDL(
+            f'CREATE INDEX IF NOT EXISTS ix_{table.name}_search_vector '
+            f'ON {table.name} USING gin (search_vector)'
+        ).execute_if(dialect='postgresql')
+    )
@@ -10,8 +10,9 @@ from app.models import (
     UserCourseProgress, UserSectionProgress,
     Transaction,
     CommunityPost, CommunityComment, CommunityLike,
-    Achievement, UserAchievement,
-    MentorAvailability, MentorBooking, Event, EventRegistration
+    Achievement, UserAchievement, UserAchievementStats, LeaderboardEntry,
+    AvailabilityTemplate, MentorAvailability, MentorBooking, Event, EventRegistration,
+    OutboxEvent
 )
 
 app = create_app()
@@ -0,0 +1,54 @@
+"""add lookup indexes
+
+Revision ID: a1f4c2d9e7b3
+Revises: 
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1f4c2d9e7b3'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (nombre, tabla, columnas) - deben coincidir con los db.Index de app/models.py
+INDEXES = [
+    ('ix_learning_courses_route_order', 'learning_courses', ['route_type', 'order_number']),
+    ('ix_learning_sections_course_order', 'learning_sections', ['course_id', 'order_number']),
+    ('ix_user_course_progress_course_id', 'user_course_progress', ['course_id']),
+    ('ix_user_section_progress_section_id', 'user_section_progress', ['section_id']),
+    ('ix_transactions_user_date', 'transactions', ['user_id', 'date']),
+    ('ix_transactions_user_type_category', 'transactions', ['user_id', 'type', 'category']),
+    ('ix_community_posts_category_created', 'community_posts', ['category', 'created_at']),
+    ('ix_community_posts_created_at', 'community_posts', ['created_at']),
+    ('ix_community_posts_user_id', 'community_posts', ['user_id']),
+    ('ix_community_comments_post_created', 'community_comments', ['post_id', 'created_at']),
+    ('ix_achievements_requirement', 'achievements', ['requirement_type', 'requirement_value']),
+    ('ix_user_achievements_achievement_id', 'user_achievements', ['achievement_id']),
+    ('ix_mentor_bookings_user_created', 'mentor_bookings', ['user_id', 'created_at']),
+    ('ix_mentor_bookings_availability_status', 'mentor_bookings', ['availability_id', 'status']),
+    ('ix_events_start_date', 'events', ['start_date']),
+    ('ix_event_registrations_user_created', 'event_registrations', ['user_id', 'created_at']),
+    ('ix_event_registrations_event_status', 'event_registrations', ['event_id', 'status']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las tablas pueden haberse creado con db.create_all() (init_db.py), que ya
+    # incluye estos índices, por eso se usa if_not_exists.
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
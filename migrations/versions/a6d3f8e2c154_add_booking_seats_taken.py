@@ -0,0 +1,66 @@
+"""add booking seats taken
+
+Revision ID: a6d3f8e2c154
+Revises: f2b8d6c1a937
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d3f8e2c154'
+down_revision: Union[str, Sequence[str], None] = 'f2b8d6c1a937'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def column_exists(table, column):
+    # SQLite no admite ADD COLUMN IF NOT EXISTS
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not column_exists('mentor_availability', 'seats_taken'):
+        op.add_column(
+            'mentor_availability',
+            sa.Column('seats_taken', sa.Integer(), nullable=False, server_default='0')
+        )
+
+    # Cancelar reservas confirmadas duplicadas (se conserva la más antigua)
+    op.execute("""
+        UPDATE mentor_bookings SET status = 'cancelled'
+        WHERE status = 'confirmed' AND EXISTS (
+            SELECT 1 FROM mentor_bookings older
+            WHERE older.availability_id = mentor_bookings.availability_id
+              AND older.user_id = mentor_bookings.user_id
+              AND older.status = 'confirmed'
+              AND (older.created_at < mentor_bookings.created_at
+                   OR (older.created_at = mentor_bookings.created_at AND older.id < mentor_bookings.id))
+        )
+    """)
+
+    op.execute("""
+        UPDATE mentor_availability SET seats_taken = (
+            SELECT COUNT(*) FROM mentor_bookings b
+            WHERE b.availability_id = mentor_availability.id AND b.status = 'confirmed'
+        )
+    """)
+
+    op.create_index(
+        'uq_mentor_bookings_confirmed', 'mentor_bookings', ['availability_id', 'user_id'],
+        unique=True,
+        postgresql_where=sa.text("status = 'confirmed'"),
+        sqlite_where=sa.text("status = 'confirmed'"),
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_mentor_bookings_confirmed', table_name='mentor_bookings', if_exists=True)
+    op.drop_column('mentor_availability', 'seats_taken')
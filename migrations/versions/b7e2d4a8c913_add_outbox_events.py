@@ -0,0 +1,42 @@
+"""add outbox events
+
+Revision ID: b7e2d4a8c913
+Revises: a1f4c2d9e7b3
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d4a8c913'
+down_revision: Union[str, Sequence[str], None] = 'a1f4c2d9e7b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'outbox_events',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('event_type', sa.String(length=50), nullable=False),
+        sa.Column('event_value', sa.String(length=255), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('processed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_outbox_events_pending', 'outbox_events', ['processed_at', 'created_at'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_outbox_events_pending', table_name='outbox_events', if_exists=True)
+    op.drop_table('outbox_events', if_exists=True)
@@ -0,0 +1,44 @@
+"""add event confirmed count
+
+Revision ID: b9e4c2a7d861
+Revises: a6d3f8e2c154
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9e4c2a7d861'
+down_revision: Union[str, Sequence[str], None] = 'a6d3f8e2c154'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def column_exists(table, column):
+    # SQLite no admite ADD COLUMN IF NOT EXISTS
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not column_exists('events', 'confirmed_count'):
+        op.add_column(
+            'events',
+            sa.Column('confirmed_count', sa.Integer(), nullable=False, server_default='0')
+        )
+
+    op.execute("""
+        UPDATE events SET confirmed_count = (
+            SELECT COUNT(*) FROM event_registrations r
+            WHERE r.event_id = events.id AND r.status = 'confirmed'
+        )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('events', 'confirmed_count')
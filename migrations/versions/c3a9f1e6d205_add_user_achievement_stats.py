@@ -0,0 +1,38 @@
+"""add user achievement stats
+
+Revision ID: c3a9f1e6d205
+Revises: b7e2d4a8c913
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a9f1e6d205'
+down_revision: Union[str, Sequence[str], None] = 'b7e2d4a8c913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las filas se calculan la primera vez que se leen o se desbloquea un logro
+    op.create_table(
+        'user_achievement_stats',
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('total_points', sa.Integer(), nullable=False),
+        sa.Column('unlocked_count', sa.Integer(), nullable=False),
+        sa.Column('by_category', sa.JSON(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('user_id'),
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_achievement_stats', if_exists=True)
@@ -0,0 +1,87 @@
+"""add availability time ranges
+
+Revision ID: c5f1a8d3e972
+Revises: b9e4c2a7d861
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5f1a8d3e972'
+down_revision: Union[str, Sequence[str], None] = 'b9e4c2a7d861'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def column_exists(table, column):
+    # SQLite no admite ADD COLUMN IF NOT EXISTS
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not column_exists('mentor_availability', 'starts_at'):
+        op.add_column('mentor_availability', sa.Column('starts_at', sa.DateTime(timezone=True), nullable=True))
+    if not column_exists('mentor_availability', 'ends_at'):
+        op.add_column('mentor_availability', sa.Column('ends_at', sa.DateTime(timezone=True), nullable=True))
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # date + time en hora de Bolivia; si end_time <= start_time cruza la medianoche
+        op.execute("""
+            UPDATE mentor_availability SET
+                starts_at = (date + start_time) AT TIME ZONE 'America/La_Paz',
+                ends_at = (date + end_time + CASE WHEN end_time <= start_time THEN interval '1 day' ELSE interval '0' END)
+                          AT TIME ZONE 'America/La_Paz'
+            WHERE starts_at IS NULL
+        """)
+        op.alter_column('mentor_availability', 'starts_at', nullable=False)
+        op.alter_column('mentor_availability', 'ends_at', nullable=False)
+    else:
+        op.execute("""
+            UPDATE mentor_availability SET
+                starts_at = datetime(date || ' ' || start_time),
+                ends_at = datetime(date || ' ' || end_time, CASE WHEN end_time <= start_time THEN '+1 day' ELSE '+0 day' END)
+            WHERE starts_at IS NULL
+        """)
+
+    op.create_index('ix_mentor_availability_mentor_starts', 'mentor_availability', ['mentor_id', 'starts_at'], unique=False, if_not_exists=True)
+    op.create_index('ix_mentor_availability_starts', 'mentor_availability', ['starts_at'], unique=False, if_not_exists=True)
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+
+    # Desactivar franjas que ya se solapan (se conserva la creada primero)
+    op.execute("""
+        UPDATE mentor_availability a SET is_available = false
+        WHERE a.is_available AND EXISTS (
+            SELECT 1 FROM mentor_availability b
+            WHERE b.mentor_id = a.mentor_id AND b.is_available AND b.id <> a.id
+              AND tstzrange(b.starts_at, b.ends_at, '[)') && tstzrange(a.starts_at, a.ends_at, '[)')
+              AND (b.created_at < a.created_at OR (b.created_at = a.created_at AND b.id < a.id))
+        )
+    """)
+
+    op.execute("""
+        ALTER TABLE mentor_availability DROP CONSTRAINT IF EXISTS mentor_availability_no_overlap;
+        ALTER TABLE mentor_availability ADD CONSTRAINT mentor_availability_no_overlap
+        EXCLUDE USING gist (mentor_id WITH =, tstzrange(starts_at, ends_at, '[)') WITH &&)
+        WHERE (is_available)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER TABLE mentor_availability DROP CONSTRAINT IF EXISTS mentor_availability_no_overlap')
+
+    op.drop_index('ix_mentor_availability_starts', table_name='mentor_availability', if_exists=True)
+    op.drop_index('ix_mentor_availability_mentor_starts', table_name='mentor_availability', if_exists=True)
+    op.drop_column('mentor_availability', 'ends_at')
+    op.drop_column('mentor_availability', 'starts_at')
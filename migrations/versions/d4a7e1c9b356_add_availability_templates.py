@@ -0,0 +1,94 @@
+"""add availability templates
+
+Revision ID: d4a7e1c9b356
+Revises: c5f1a8d3e972
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7e1c9b356'
+down_revision: Union[str, Sequence[str], None] = 'c5f1a8d3e972'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def column_exists(table, column):
+    # SQLite no admite ADD COLUMN IF NOT EXISTS
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def template_date_unique_exists():
+    """Las bases creadas con db.create_all ya tienen unique_template_date"""
+    inspector = sa.inspect(op.get_bind())
+    columns = ['template_id', 'date']
+    return any(
+        sorted(item['column_names']) == columns
+        for item in inspector.get_unique_constraints('mentor_availability')
+    ) or any(
+        item['unique'] and sorted(item['column_names']) == columns
+        for item in inspector.get_indexes('mentor_availability')
+    )
+
+
+def template_fk_exists():
+    return any(
+        fk['constrained_columns'] == ['template_id'] and fk['referred_table'] == 'availability_templates'
+        for fk in sa.inspect(op.get_bind()).get_foreign_keys('mentor_availability')
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'availability_templates',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('mentor_id', sa.String(length=36), nullable=False),
+        sa.Column('weekdays', sa.String(length=20), nullable=False),
+        sa.Column('interval_weeks', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('starts_on', sa.Date(), nullable=False),
+        sa.Column('until', sa.Date(), nullable=True),
+        sa.Column('start_time', sa.Time(), nullable=False),
+        sa.Column('end_time', sa.Time(), nullable=False),
+        sa.Column('session_type', sa.String(length=20), nullable=False),
+        sa.Column('max_participants', sa.Integer(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_availability_templates_mentor', 'availability_templates', ['mentor_id'], unique=False, if_not_exists=True)
+
+    if not column_exists('mentor_availability', 'template_id'):
+        op.add_column('mentor_availability', sa.Column('template_id', sa.String(length=36), nullable=True))
+
+    if op.get_bind().dialect.name == 'postgresql':
+        if not template_fk_exists():
+            op.create_foreign_key(
+                'mentor_availability_template_id_fkey', 'mentor_availability', 'availability_templates',
+                ['template_id'], ['id'], ondelete='SET NULL'
+            )
+        if not template_date_unique_exists():
+            op.create_unique_constraint('unique_template_date', 'mentor_availability', ['template_id', 'date'])
+    elif not template_date_unique_exists():
+        # SQLite no agrega restricciones con ALTER TABLE: índice único equivalente
+        op.create_index('unique_template_date', 'mentor_availability', ['template_id', 'date'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('unique_template_date', 'mentor_availability', type_='unique', if_exists=True)
+        op.drop_constraint('mentor_availability_template_id_fkey', 'mentor_availability', type_='foreignkey', if_exists=True)
+    else:
+        op.drop_index('unique_template_date', table_name='mentor_availability', if_exists=True)
+
+    op.drop_column('mentor_availability', 'template_id')
+    op.drop_index('ix_availability_templates_mentor', table_name='availability_templates', if_exists=True)
+    op.drop_table('availability_templates', if_exists=True)
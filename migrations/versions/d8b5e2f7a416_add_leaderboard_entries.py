@@ -0,0 +1,73 @@
+"""add leaderboard entries
+
+Revision ID: d8b5e2f7a416
+Revises: c3a9f1e6d205
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8b5e2f7a416'
+down_revision: Union[str, Sequence[str], None] = 'c3a9f1e6d205'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Puntos desbloqueados por usuario (y categoría) desde user_achievements
+UNLOCKED_POINTS = """
+    SELECT ua.user_id AS user_id,
+           COALESCE(a.category, 'otros') AS category,
+           COALESCE(a.points, 0) AS points
+    FROM user_achievements ua
+    JOIN achievements a ON a.id = ua.achievement_id
+    WHERE ua.progress >= 100
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'leaderboard_entries',
+        sa.Column('board', sa.String(length=80), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('points', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('board', 'user_id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_leaderboard_entries_board_points', 'leaderboard_entries', ['board', 'points', 'user_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_leaderboard_entries_updated_at', 'leaderboard_entries', ['updated_at'], unique=False, if_not_exists=True)
+
+    # Cargar los tableros con los logros ya desbloqueados
+    op.execute(f"""
+        INSERT INTO leaderboard_entries (board, user_id, points, updated_at)
+        SELECT 'global', p.user_id, SUM(p.points), CURRENT_TIMESTAMP
+        FROM ({UNLOCKED_POINTS}) p
+        GROUP BY p.user_id
+    """)
+    op.execute(f"""
+        INSERT INTO leaderboard_entries (board, user_id, points, updated_at)
+        SELECT 'category:' || p.category, p.user_id, SUM(p.points), CURRENT_TIMESTAMP
+        FROM ({UNLOCKED_POINTS}) p
+        GROUP BY p.category, p.user_id
+    """)
+    op.execute("""
+        INSERT INTO leaderboard_entries (board, user_id, points, updated_at)
+        SELECT DISTINCT 'route:' || c.route_type, g.user_id, g.points, CURRENT_TIMESTAMP
+        FROM leaderboard_entries g
+        JOIN user_course_progress ucp ON ucp.user_id = g.user_id
+        JOIN learning_courses c ON c.id = ucp.course_id
+        WHERE g.board = 'global'
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_leaderboard_entries_updated_at', table_name='leaderboard_entries', if_exists=True)
+    op.drop_index('ix_leaderboard_entries_board_points', table_name='leaderboard_entries', if_exists=True)
+    op.drop_table('leaderboard_entries', if_exists=True)
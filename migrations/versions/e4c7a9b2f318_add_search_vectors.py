@@ -0,0 +1,55 @@
+"""add search vectors
+
+Revision ID: e4c7a9b2f318
+Revises: d8b5e2f7a416
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4c7a9b2f318'
+down_revision: Union[str, Sequence[str], None] = 'd8b5e2f7a416'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Columna generada: title pesa A, el resto B/C (ver app/search.py)
+SEARCH_VECTORS = {
+    'community_posts': """
+        setweight(to_tsvector('spanish', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(content, '')), 'B')
+    """,
+    'learning_sections': """
+        setweight(to_tsvector('spanish', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('spanish', coalesce(content, '')), 'C')
+    """,
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # tsvector y GIN solo existen en PostgreSQL; SQLite usa el índice en memoria
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for table, expression in SEARCH_VECTORS.items():
+        op.execute(f"""
+            ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS ({expression}) STORED
+        """)
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'], unique=False, postgresql_using='gin', if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for table in SEARCH_VECTORS:
+        op.drop_index(f'ix_{table}_search_vector', table_name=table, if_exists=True)
+        op.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
@@ -0,0 +1,41 @@
+"""add post hot score
+
+Revision ID: f2b8d6c1a937
+Revises: e4c7a9b2f318
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b8d6c1a937'
+down_revision: Union[str, Sequence[str], None] = 'e4c7a9b2f318'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def column_exists(table, column):
+    # SQLite no admite ADD COLUMN IF NOT EXISTS
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not column_exists('community_posts', 'hot_score'):
+        op.add_column(
+            'community_posts',
+            sa.Column('hot_score', sa.Float(), nullable=False, server_default='0')
+        )
+    op.create_index('ix_community_posts_hot', 'community_posts', ['hot_score', 'id'], unique=False, if_not_exists=True)
+    op.create_index('ix_community_posts_category_hot', 'community_posts', ['category', 'hot_score', 'id'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_community_posts_category_hot', table_name='community_posts', if_exists=True)
+    op.drop_index('ix_community_posts_hot', table_name='community_posts', if_exists=True)
+    op.drop_column('community_posts', 'hot_score')
@@ -12,7 +12,7 @@ from app.models import (
     LearningCourse, LearningSection, Transaction, 
     CommunityPost, CommunityComment, CommunityLike,
     Achievement, UserAchievement,
-    MentorAvailability, Event
+    AvailabilityTemplate, MentorAvailability, Event
 )
 
 app = create_app()
@@ -386,10 +386,11 @@ def seed_calendar_data():
     """Poblar la base de datos con datos de calendario de ejemplo"""
     with app.app_context():
         # Verificar si ya existen datos
-        existing = MentorAvailability.query.count()
+        existing = MentorAvailability.query.count() + AvailabilityTemplate.query.count()
         if existing > 0:
             print(f"⚠️  Ya existen {existing} disponibilidades. Limpiando...")
             MentorAvailability.query.delete()
+            AvailabilityTemplate.query.delete()
             Event.query.delete()
             db.session.commit()
         
@@ -401,40 +402,34 @@ def seed_calendar_data():
         # ID del mentor (fijo para ejemplo)
         mentor_id = "mentor-1"
         
-        # Crear disponibilidad del mentor para las próximas 4 semanas
+        # Disponibilidad semanal recurrente: se expande al consultar
+        # (ver app.availability), sin una fila por fecha
         print("  📆 Creando disponibilidad del mentor...")
-        for week in range(4):
-            for day in range(5):  # Lunes a Viernes
-                date_offset = week * 7 + day
-                avail_date = (now + timedelta(days=date_offset)).date()
-                
-                # Sesiones individuales: 9:00, 11:00, 15:00
-                for hour in [9, 11, 15]:
-                    availability = MentorAvailability(
-                        id=str(uuid.uuid4()),
-                        mentor_id=mentor_id,
-                        date=avail_date,
-                        start_time=time(hour, 0),
-                        end_time=time(hour + 1, 0),
-                        session_type='individual',
-                        max_participants=1,
-                        is_available=True
-                    )
-                    db.session.add(availability)
-                
-                # Sesión grupal: 17:00
-                if day % 2 == 0:  # Lunes, Miércoles, Viernes
-                    availability = MentorAvailability(
-                        id=str(uuid.uuid4()),
-                        mentor_id=mentor_id,
-                        date=avail_date,
-                        start_time=time(17, 0),
-                        end_time=time(18, 30),
-                        session_type='grupo',
-                        max_participants=5,
-                        is_available=True
-                    )
-                    db.session.add(availability)
+        
+        # Sesiones individuales de lunes a viernes: 9:00, 11:00, 15:00
+        for hour in [9, 11, 15]:
+            db.session.add(AvailabilityTemplate(
+                id=str(uuid.uuid4()),
+                mentor_id=mentor_id,
+                weekdays='MO,TU,WE,TH,FR',
+                starts_on=now.date(),
+                start_time=time(hour, 0),
+                end_time=time(hour + 1, 0),
+                session_type='individual',
+                max_participants=1
+            ))
+        
+        # Sesión grupal: 17:00 (Lunes, Miércoles, Viernes)
+        db.session.add(AvailabilityTemplate(
+            id=str(uuid.uuid4()),
+            mentor_id=mentor_id,
+            weekdays='MO,WE,FR',
+            starts_on=now.date(),
+            start_time=time(17, 0),
+            end_time=time(18, 30),
+            session_type='grupo',
+            max_participants=5
+        ))
         
         db.session.commit()
         print("  ✓ Disponibilidad del mentor creada")